@@ -0,0 +1,249 @@
+import argparse
+import copy
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, List
+
+import pytz
+
+import meic
+from fake_api import synthetic_chain, synthetic_portfolio
+from meic import (ColumnarOptionChain, CompactPortfolio, CompactQuote, GreeksCache, OptionChain, OptionsPositionSummary,
+                  Portfolio, PortfolioStore, Quote, chain_spot_quote,
+                  compute_local_greeks, decode, decode_json, decode_many, get_atm_strike_index, get_short_strike,
+                  morning_of_expiry, parse_option_symbol, scan_iron_condor)
+
+
+CHAIN_FIXTURE = "Get_Option_Chain.json"
+PORTFOLIO_FIXTURE = "portfolio.json"
+# a case this much slower than in the --compare file is flagged
+REGRESSION_THRESHOLD = 1.20
+
+
+# -----------------------------
+# Measurement helpers
+# -----------------------------
+
+def measure(fn: Callable, repeat: int = 7, min_run_seconds: float = 0.02) -> dict:
+    """Per-call timings in microseconds. Calls per run are calibrated so each run lasts at least min_run_seconds."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_run_seconds or number >= 1 << 20:
+            break
+        number *= 2
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number * 1e6)
+    runs.sort()
+    return {"best_us": runs[0], "median_us": runs[len(runs) // 2], "calls_per_run": number, "runs": repeat}
+
+def retained_bytes(fn: Callable) -> int:
+    """Bytes still allocated by fn's result once it returns, including anything it parsed and kept."""
+    tracemalloc.start()
+    result = fn()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+# -----------------------------
+# Inputs
+# -----------------------------
+
+def load_json(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def warm_greeks(chain: OptionChain, quote: Quote) -> None:
+    """Swap in a never-expiring greeks cache holding every strike, so get_short_strike runs without the network."""
+    local = compute_local_greeks(chain, quote, now=morning_of_expiry(chain.calls[0].instrument.symbol))
+    cache = GreeksCache(ttl_seconds=float("inf"), max_entries=len(chain.calls) + len(chain.puts))
+    for side in (local.calls, local.puts):
+        for i in range(len(side.symbols)):
+            cache.put(side.greeks_at(i))
+    meic.greeks_cache = cache
+
+
+# -----------------------------
+# Cases
+# -----------------------------
+
+def chain_cases(label: str, payload: dict) -> List[tuple]:
+    chain = OptionChain.from_dict(payload)
+    quote = chain_spot_quote(chain)
+    symbols = [q["instrument"]["symbol"] for q in payload["calls"] + payload["puts"]]
+    atm_call = chain.atm_index(quote.last, "CALL")
+    atm_put = chain.atm_index(quote.last, "PUT")
+    now = morning_of_expiry(chain.calls[0].instrument.symbol)
+
+    def parse_all():
+        for symbol in symbols:
+            parse_option_symbol(symbol)
+
+    def atm_indexes():
+        get_atm_strike_index("CALL", quote.last, chain)
+        get_atm_strike_index("PUT", quote.last, chain)
+
+    def short_strikes():
+        get_short_strike(chain, "CALL", atm_call, meic.EXPECTED_MOVE)
+        get_short_strike(chain, "PUT", atm_put, meic.EXPECTED_MOVE)
+
+    return [
+        ("OptionChain.from_dict", label, lambda: OptionChain.from_dict(payload), None),
+        ("OptionChain.from_dict(lazy)", label, lambda: OptionChain.from_dict(payload, lazy=True), None),
+        ("ColumnarOptionChain.from_dict", label, lambda: ColumnarOptionChain.from_dict(payload), None),
+        (f"parse_option_symbol x{len(symbols)}", label, parse_all, None),
+        ("get_atm_strike_index (call+put)", label, atm_indexes, None),
+        # the greeks cache is per chain, so it is swapped in right before this case is timed
+        ("get_short_strike (call+put, cached greeks)", label, short_strikes, lambda: warm_greeks(chain, quote)),
+        (f"scan_iron_condor (widths {meic.SCAN_WIDTHS})", label, lambda: scan_iron_condor(chain, quote, now=now), None),
+    ]
+
+def portfolio_cases(label: str, payload: dict) -> List[tuple]:
+    def sorted_portfolio():
+        portfolio = Portfolio.from_dict(payload)
+        portfolio.sort_positons()
+        return portfolio
+
+    raw = json.dumps(payload).encode()
+
+    def full_rebuild():
+        store = PortfolioStore()
+        store.apply(payload)
+        store.evaluate_option_positions(OptionsPositionSummary())
+
+    # the next response with one position repriced, applied on top of the previous one. Each response is
+    # its own copy, as freshly parsed bodies are, so unchanged entries are equal but never the same objects
+    moved = copy.deepcopy(payload)
+    moved["positions"][0]["currentValue"] = "-1.00"
+    unmoved = copy.deepcopy(payload)
+    store = PortfolioStore()
+    store.apply(payload)
+
+    def one_change():
+        store.apply(moved)
+        store.apply(unmoved)
+        store.evaluate_option_positions(OptionsPositionSummary())
+
+    return [
+        ("Portfolio.from_dict", label, lambda: Portfolio.from_dict(payload), None),
+        ("Portfolio.from_dict + sort_positons", label, sorted_portfolio, None),
+        ("decode(CompactPortfolio)", label, lambda: decode(CompactPortfolio, payload), None),
+        # from the response body, as the wrappers see it
+        ("json.loads + Portfolio.from_dict", label, lambda: Portfolio.from_dict(json.loads(raw)), None),
+        ("decode_json(CompactPortfolio)", label, lambda: decode_json(CompactPortfolio, raw), None),
+        ("PortfolioStore.apply (from empty)", label, full_rebuild, None),
+        ("PortfolioStore.apply x2 (1 position moved)", label, one_change, None),
+    ]
+
+def quote_cases(label: str, payload: dict) -> List[tuple]:
+    entries = payload["calls"] + payload["puts"]
+    return [
+        (f"Quote.from_dict x{len(entries)}", label, lambda: [Quote.from_dict(e) for e in entries], None),
+        (f"decode_many(CompactQuote) x{len(entries)}", label, lambda: decode_many(CompactQuote, entries), None),
+    ]
+
+def collect_cases(strike_count: int, position_count: int) -> List[tuple]:
+    """(name, input label, fn, setup) for every benchmark, setup runs right before fn is timed."""
+    cases = []
+    cases += chain_cases(CHAIN_FIXTURE, load_json(CHAIN_FIXTURE))
+    cases += chain_cases(f"synthetic {strike_count} strikes", synthetic_chain(strike_count))
+    cases += quote_cases(f"synthetic {strike_count} strikes", synthetic_chain(strike_count))
+    cases += portfolio_cases(PORTFOLIO_FIXTURE, load_json(PORTFOLIO_FIXTURE))
+    cases += portfolio_cases(f"synthetic {position_count} positions", synthetic_portfolio(position_count))
+    return cases
+
+
+# -----------------------------
+# Suite
+# -----------------------------
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_suite(strike_count: int, position_count: int) -> dict:
+    original_greeks_cache = meic.greeks_cache
+    results = []
+    try:
+        for name, label, fn, setup in collect_cases(strike_count, position_count):
+            if setup:
+                setup()
+            timing = measure(fn)
+            results.append({"name": name, "input": label, **timing})
+            print(f"{name:<45} {label:<28} {timing['best_us']:>12.1f} us  (median {timing['median_us']:.1f})")
+    finally:
+        meic.greeks_cache = original_greeks_cache
+
+    # what each representation keeps alive, parse time alone hides that. Measured from the raw response bytes,
+    # so whatever parsed JSON a representation holds on to (a lazy chain keeps its entries) is counted too
+    raw_chain = json.dumps(synthetic_chain(strike_count)).encode()
+    chain_label = f"synthetic {strike_count} strikes"
+    raw_portfolio = json.dumps(synthetic_portfolio(position_count)).encode()
+    portfolio_label = f"synthetic {position_count} positions"
+
+    def all_entries(d: dict) -> List[dict]:
+        return d["calls"] + d["puts"]
+
+    for name, label, fn in (
+        ("OptionChain.from_dict", chain_label, lambda: OptionChain.from_dict(json.loads(raw_chain))),
+        ("OptionChain.from_dict(lazy)", chain_label, lambda: OptionChain.from_dict(json.loads(raw_chain), lazy=True)),
+        ("ColumnarOptionChain.from_dict", chain_label, lambda: ColumnarOptionChain.from_dict(json.loads(raw_chain))),
+        ("Quote.from_dict (all)", chain_label, lambda: [Quote.from_dict(e) for e in all_entries(json.loads(raw_chain))]),
+        ("decode_many(CompactQuote) (all)", chain_label, lambda: decode_many(CompactQuote, all_entries(json.loads(raw_chain)))),
+        ("Portfolio.from_dict", portfolio_label, lambda: Portfolio.from_dict(json.loads(raw_portfolio))),
+        ("decode(CompactPortfolio)", portfolio_label, lambda: decode(CompactPortfolio, json.loads(raw_portfolio))),
+    ):
+        retained = retained_bytes(fn)
+        results.append({"name": f"{name} retained", "input": label, "bytes": retained})
+        print(f"{name + ' retained':<45} {label:<28} {retained / 1024:>12.1f} KiB")
+
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "created": datetime.now(pytz.utc).isoformat(),
+        "results": results,
+    }
+
+def compare(current: dict, previous: dict) -> None:
+    before = {(r["name"], r["input"]): r for r in previous["results"]}
+    print(f"\nvs {previous.get('revision', '?')} ({previous.get('created', '?')})")
+    for result in current["results"]:
+        old = before.get((result["name"], result["input"]))
+        key = "best_us" if "best_us" in result else "bytes"
+        if old is None or not old.get(key):
+            continue
+        ratio = result[key] / old[key]
+        flag = "  REGRESSION" if ratio > REGRESSION_THRESHOLD else ""
+        print(f"{result['name']:<45} {result['input']:<28} {ratio:>6.2f}x{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the parsing and strike selection hot paths")
+    parser.add_argument("--strikes", type=int, default=5000, help="strikes per side in the synthetic chain")
+    parser.add_argument("--positions", type=int, default=500, help="positions in the synthetic portfolio")
+    parser.add_argument("--output", default="bench_results.json", help="where to save this run")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    report = run_suite(args.strikes, args.positions)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {len(report['results'])} results to {args.output}")
+
+    if args.compare:
+        compare(report, load_json(args.compare))
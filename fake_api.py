@@ -0,0 +1,452 @@
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import pytz
+
+import numpy as np
+
+from meic import (ColumnarOptionChain, Instrument, LastTrade, LocalGreeks, OptionChain, OptionsPositionSummary, Quote,
+                  QuoteStream, QuoteTransport, black_scholes_price, compute_local_greeks, get_client, morning_of_expiry, pst,
+                  run_cycle_async, underlying_stub, chain_cache, configure_logging, greeks_cache, metrics, stop_logging)
+
+
+CHAIN_FIXTURE = "Get_Option_Chain.json"
+PORTFOLIO_FIXTURE = "portfolio.json"
+BASE_PATH = "/userapigateway"
+
+
+# -----------------------------
+# Synthetic inputs
+# -----------------------------
+
+def synthetic_chain(strike_count: int, base_symbol: str = "SPY", spot: float = 600.0, expiration: str = "251230") -> dict:
+    """Option chain payload shaped like the option-chain endpoint response, with $1 strikes centered on spot
+    (or starting at $1 when there are more strikes than that allows). Every third strike has null open
+    interest, as strikes listed that morning come back.
+    """
+    first_strike = max(int(spot) - strike_count // 2, 1)
+
+    def entry(cp_flag: str, strike: int) -> dict:
+        intrinsic = max(spot - strike, 0) if cp_flag == "C" else max(strike - spot, 0)
+        bid = round(intrinsic + 0.05, 2)
+        return {
+            "instrument": {"symbol": f"{base_symbol}{expiration}{cp_flag}{strike * 1000:08d}", "type": "OPTION"},
+            "outcome": "SUCCESS",
+            "last": f"{bid:.2f}",
+            "lastTimestamp": "2025-12-30T18:48:33Z",
+            "bid": f"{bid:.2f}",
+            "bidSize": 10,
+            "bidTimestamp": "2025-12-30T20:59:36Z",
+            "ask": f"{bid + 0.02:.2f}",
+            "askSize": 10,
+            "askTimestamp": "2025-12-30T20:59:36Z",
+            "volume": 100,
+            "openInterest": None if strike % 3 == 0 else 1000,
+        }
+
+    strikes = range(first_strike, first_strike + strike_count)
+    return {
+        "baseSymbol": base_symbol,
+        "calls": [entry("C", k) for k in strikes],
+        "puts": [entry("P", k) for k in strikes],
+    }
+
+
+def synthetic_portfolio(position_count: int, base_symbol: str = "SPY", spot: float = 600.0, expiration: str = "251230") -> dict:
+    """Portfolio payload shaped like portfolio/v2: mostly short/long call and put spread legs, some stock."""
+    def gain(value: float, pct: float) -> dict:
+        return {"gainValue": f"{value:.2f}", "gainPercentage": f"{pct:.2f}", "timestamp": None}
+
+    positions = []
+    for i in range(position_count):
+        if i % 5 == 4:
+            symbol, name, kind, quantity = f"STK{i}", f"Stock {i}", "EQUITY", 10
+        else:
+            cp_flag = "C" if i % 2 == 0 else "P"
+            # one position per symbol, like a real account
+            strike = int(spot) + (5 + i // 2) * (1 if cp_flag == "C" else -1)
+            symbol = f"{base_symbol}{expiration}{cp_flag}{strike * 1000:08d}-OPTION"
+            name, kind, quantity = f"{base_symbol} ${strike} {'Call' if cp_flag == 'C' else 'Put'}", "OPTION", -1 if i % 4 < 2 else 1
+        price = 0.30 + (i % 7) * 0.05
+        pct = -90.0 + (i % 10) * 15
+        positions.append({
+            "instrument": {"symbol": symbol, "name": name, "type": kind},
+            "quantity": str(quantity),
+            "openedAt": "2025-12-29T19:48:38.843Z",
+            "currentValue": f"{price * 100 * quantity:.2f}",
+            "percentOfPortfolio": "0.10",
+            "lastPrice": {"lastPrice": f"{price:.2f}", "timestamp": "2025-12-29T20:02:12Z"},
+            "instrumentGain": gain(price * pct, pct),
+            "positionDailyGain": gain(price, 1.0),
+            "costBasis": {
+                "totalCost": f"{price * 100 * quantity:.2f}", "unitCost": f"{price:.2f}",
+                "gainValue": f"{price:.2f}", "gainPercentage": f"{pct:.2f}", "lastUpdate": "2025-12-29T19:48:38.843Z",
+            },
+        })
+    return {
+        "accountId": "12345",
+        "accountType": "BROKERAGE",
+        "buyingPower": {"cashOnlyBuyingPower": "624.66", "buyingPower": "2109.62", "optionsBuyingPower": "964.83"},
+        "equity": [{"type": "CASH", "value": "624.66", "percentageOfPortfolio": "30.48"}],
+        "positions": positions,
+        "orders": [],
+    }
+
+
+# -----------------------------
+# Stand-in API
+# -----------------------------
+
+class FakePublicApi:
+    """Serves the endpoints meic.py uses from recorded or synthetic payloads.
+
+    Chains are looked up by base symbol (any other symbol gets a synthetic chain), the underlying
+    quote comes from put-call parity on its chain, and greeks are priced with compute_local_greeks.
+    latency / jitter (seconds) and error_rate are applied to every request, endpoint_latency overrides
+    latency per endpoint family ("quotes", "option-chain", "greeks", "portfolio", "preflight", "order").
+    Preflights and orders with more than max_legs legs are refused with a 400, like an API without four-leg orders.
+    """
+    def __init__(self, chains: Dict[str, dict], portfolio: dict, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, endpoint_latency: Optional[Dict[str, float]] = None,
+                 seed: Optional[int] = None, max_legs: Optional[int] = None, retry_after: Optional[float] = None):
+        self.chains = dict(chains)
+        self.portfolio = portfolio
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.endpoint_latency = endpoint_latency or {}
+        self.max_legs = max_legs
+        # sent as Retry-After on injected errors when set
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.orders = []
+        self.request_counts: Dict[str, int] = {}
+        self._greeks: Dict[str, LocalGreeks] = {}
+        self._lock = threading.Lock()
+
+    def chain(self, symbol: str) -> dict:
+        with self._lock:
+            if symbol not in self.chains:
+                self.chains[symbol] = synthetic_chain(201, base_symbol=symbol)
+            return self.chains[symbol]
+
+    def spot(self, symbol: str) -> float:
+        return ColumnarOptionChain.from_dict(self.chain(symbol)).parity_spot()
+
+    def local_greeks(self, symbol: str) -> LocalGreeks:
+        with self._lock:
+            cached = self._greeks.get(symbol)
+        if cached is not None:
+            return cached
+        payload = self.chain(symbol)
+        chain = OptionChain.from_dict(payload, lazy=True)
+        underlying = underlying_stub(symbol, self.spot(symbol))
+        greeks = compute_local_greeks(chain, underlying, now=morning_of_expiry(payload["calls"][0]["instrument"]["symbol"]))
+        with self._lock:
+            self._greeks[symbol] = greeks
+        return greeks
+
+    # --- endpoints ---
+
+    def quotes(self, body: dict) -> dict:
+        quotes = []
+        for instrument in body["instruments"]:
+            symbol = instrument["symbol"]
+            if instrument["type"] == "OPTION":
+                underlying = symbol[:-15]
+                entries = self.chain(underlying)["calls"] + self.chain(underlying)["puts"]
+                match = next((e for e in entries if e["instrument"]["symbol"] == symbol), None)
+                if match is None:
+                    quotes.append({"instrument": instrument, "outcome": "UNKNOWN"})
+                    continue
+                quotes.append(match)
+                continue
+            spot = f"{self.spot(symbol):.2f}"
+            stamp = datetime.now(pytz.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            quotes.append({
+                "instrument": instrument, "outcome": "SUCCESS",
+                "last": spot, "lastTimestamp": stamp,
+                "bid": spot, "bidSize": 100, "bidTimestamp": stamp,
+                "ask": spot, "askSize": 100, "askTimestamp": stamp,
+                "volume": 0, "openInterest": None,
+            })
+        return {"quotes": quotes}
+
+    def option_chain(self, body: dict) -> dict:
+        return self.chain(body["instrument"]["symbol"])
+
+    def greeks(self, query: dict) -> dict:
+        results = []
+        for symbol in query.get("osiSymbols", []):
+            side = self.local_greeks(symbol[:-15]).side("CALL" if symbol[-9] == "C" else "PUT")
+            g = side.get(symbol)
+            if g is None:
+                continue
+            results.append({
+                "symbol": symbol,
+                "greeks": {
+                    "delta": f"{g.delta:.4f}", "gamma": f"{g.gamma:.4f}", "theta": f"{g.theta:.4f}",
+                    "vega": f"{g.vega:.4f}", "rho": f"{g.rho:.4f}", "impliedVolatility": f"{g.impliedVolatility:.4f}",
+                },
+            })
+        return {"greeks": results}
+
+    def preflight(self, body: dict) -> dict:
+        quantity = int(body.get("quantity", 1))
+        limit_price = float(body.get("limitPrice", 0))
+        return {
+            "estimatedCommission": "0.00",
+            "estimatedCost": f"{limit_price * 100 * quantity:.2f}",
+            "legs": body.get("legs", []),
+        }
+
+    def order(self, body: dict) -> dict:
+        order_id = body.get("orderId") or str(uuid.uuid4())
+        with self._lock:
+            self.orders.append(body)
+        return {"orderId": order_id}
+
+    # --- dispatch ---
+
+    ROUTES = [
+        ("POST", "/quotes", "quotes"),
+        ("POST", "/option-chain", "option-chain"),
+        ("GET", "/greeks", "greeks"),
+        ("GET", "/portfolio/v2", "portfolio"),
+        ("POST", "/preflight/multi-leg", "preflight"),
+        ("POST", "/order/multileg", "order"),
+    ]
+
+    def handle(self, method: str, path: str, query: dict, body: dict):
+        """Returns (status, payload)."""
+        endpoint = next((name for m, suffix, name in self.ROUTES if m == method and path.endswith(suffix)), None)
+        if endpoint is None:
+            return 404, {"message": f"No route for {method} {path}"}
+        with self._lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+        delay = self.endpoint_latency.get(endpoint, self.latency)
+        if self.jitter:
+            delay = max(delay + self.random.uniform(-self.jitter, self.jitter), 0.0)
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return self.error_status, {"message": "injected error"}
+
+        if endpoint in ("preflight", "order") and self.max_legs is not None and len(body.get("legs", [])) > self.max_legs:
+            return 400, {"message": f"Multi-leg orders support at most {self.max_legs} legs"}
+        if endpoint == "quotes":
+            return 200, self.quotes(body)
+        if endpoint == "option-chain":
+            return 200, self.option_chain(body)
+        if endpoint == "greeks":
+            return 200, self.greeks(query)
+        if endpoint == "portfolio":
+            return 200, self.portfolio
+        if endpoint == "preflight":
+            return 200, self.preflight(body)
+        return 200, self.order(body)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive, so the pooled client can reuse connections like it would against the real API
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as separate writes, without this delayed ACKs add ~40 ms to reused connections
+    disable_nagle_algorithm = True
+    api: FakePublicApi = None
+
+    def _respond(self, method: str) -> None:
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        status, payload = self.api.handle(method, url.path, parse_qs(url.query), body)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        if status >= 400 and self.api.retry_after is not None:
+            self.send_header("Retry-After", f"{self.api.retry_after:g}")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up (timed out) before the response was ready
+            pass
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(api: FakePublicApi, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the stand-in on a background thread. The base URL for ApiClient is
+    f"http://{host}:{server.server_port}{BASE_PATH}".
+    """
+    handler = type("Handler", (_Handler,), {"api": api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def load_fixtures(**kwargs) -> FakePublicApi:
+    with open(CHAIN_FIXTURE) as f:
+        chain = json.load(f)
+    with open(PORTFOLIO_FIXTURE) as f:
+        portfolio = json.load(f)
+    return FakePublicApi({chain["baseSymbol"]: chain}, portfolio, **kwargs)
+
+
+# -----------------------------
+# Fake quote feed
+# -----------------------------
+
+class FakeQuoteFeed(QuoteTransport):
+    """Random-walk feed for running a QuoteStream offline. Every tick each subscribed underlying moves
+    by a normal step (dollars) from its stand-in spot, and subscribed options are repriced at the
+    implied volatility the stand-in solved for them. Stops by itself after ticks, if given.
+    """
+    def __init__(self, api: FakePublicApi, interval: float = 0.1, step: float = 0.10, seed: Optional[int] = None,
+                 ticks: Optional[int] = None):
+        self.api = api
+        self.interval = interval
+        self.step = step
+        self.ticks = ticks
+        self.random = random.Random(seed)
+        self.spots: Dict[str, float] = {}
+
+    def _quote(self, instrument: Instrument, price: float, half_spread: float) -> Quote:
+        price = round(price, 2)
+        return Quote(instrument, "SUCCESS", price, None, round(max(price - half_spread, 0.0), 2), 10, None,
+                     round(price + half_spread, 2), 10, None, 0, 0)
+
+    def _option_price(self, symbol: str) -> Optional[float]:
+        underlying = symbol[:-15]
+        local = self.api.local_greeks(underlying)
+        greeks = local.side("CALL" if symbol[-9] == "C" else "PUT").get(symbol)
+        if greeks is None:
+            return None
+        price = black_scholes_price(np.array([symbol[-9] == "C"]), self.spots[underlying], np.array([greeks.strike]),
+                                    local.years_to_expiry, local.rate, np.array([greeks.impliedVolatility]))
+        return float(price[0])
+
+    def run(self, stream: QuoteStream, stop: threading.Event) -> None:
+        tick = 0
+        while not stop.is_set() and (self.ticks is None or tick < self.ticks):
+            instruments = stream.subscribed()
+            underlyings = {i.symbol[:-15] if i.type == "OPTION" else i.symbol for i in instruments}
+            for underlying in underlyings:
+                spot = self.spots.get(underlying)
+                if spot is None:
+                    spot = self.api.spot(underlying)
+                self.spots[underlying] = spot + self.random.gauss(0.0, self.step)
+            for instrument in instruments:
+                if instrument.type == "OPTION":
+                    price = self._option_price(instrument.symbol)
+                    if price is not None:
+                        stream.publish(self._quote(instrument, price, 0.01))
+                else:
+                    stream.publish(self._quote(instrument, self.spots[instrument.symbol], 0.0))
+            tick += 1
+            stop.wait(self.interval)
+
+
+# -----------------------------
+# Replay harness
+# -----------------------------
+
+def replay(api: FakePublicApi, cycles: int, symbol: str, expiration_date: str, metrics_file: Optional[str] = None,
+           stream: bool = False) -> None:
+    """Run full trading cycles (with entry) against the stand-in and print per-cycle wall time.
+    With stream, the underlying quote and the chain around ATM come from a FakeQuoteFeed.
+    """
+    server = serve(api)
+    api_key = "replay"
+    get_client(api_key, base_url=f"http://127.0.0.1:{server.server_port}{BASE_PATH}")
+    quote_stream = None
+    if stream:
+        quote_stream = QuoteStream(FakeQuoteFeed(api, seed=api.random.random())).start()
+        quote_stream.subscribe([Instrument(symbol, "EQUITY")])
+        time.sleep(0.2)
+    # inside the entry window so every cycle builds and submits a condor
+    now = pst.localize(datetime.combine(datetime.now(pst).date(), datetime.min.time()).replace(hour=7))
+
+    timings = []
+    failures = 0
+    for _ in range(cycles):
+        # fresh trade state and caches so each cycle pays for every request
+        chain_cache.invalidate()
+        greeks_cache.clear()
+        start = time.perf_counter()
+        try:
+            asyncio.run(run_cycle_async(Instrument(symbol, "EQUITY"), "replay-account", api_key, expiration_date,
+                                        OptionsPositionSummary(), LastTrade(), now=now, stream=quote_stream))
+        except Exception as e:
+            # injected errors surface here the same way they would against the real API
+            failures += 1
+            print(f"cycle failed: {e!r}")
+        timings.append((time.perf_counter() - start) * 1000)
+
+    server.shutdown()
+    if quote_stream is not None:
+        quote_stream.stop()
+        print(f"quote stream: {quote_stream.updates} updates, {quote_stream.changes} price changes")
+    timings.sort()
+    stats = get_client(api_key).connection_stats()
+    print(f"{cycles} cycles ({failures} failed): median {timings[len(timings) // 2]:.0f} ms, max {timings[-1]:.0f} ms, "
+          f"{len(api.orders)} orders, requests {api.request_counts}")
+    print(f"connections: {stats.requests_sent} requests over {stats.connections_opened} connections")
+    if metrics_file:
+        metrics.write_textfile(metrics_file)
+        print(f"metrics written to {metrics_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Public API serving recorded / synthetic data")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, help="Retry-After seconds sent with injected errors")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--max-legs", type=int, help="refuse preflights / orders with more legs than this")
+    parser.add_argument("--replay", type=int, metavar="CYCLES", help="run trading cycles in-process instead of serving")
+    parser.add_argument("--symbol", default="QQQ")
+    parser.add_argument("--expiration", default="2025-12-22")
+    parser.add_argument("--metrics-file", help="write the replay's Prometheus metrics here")
+    parser.add_argument("--stream", action="store_true", help="feed the replay's quotes from a FakeQuoteFeed")
+    parser.add_argument("--log-file", help="write the replay's events here as JSON lines")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    api = load_fixtures(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        error_status=args.error_status, seed=args.seed, max_legs=args.max_legs,
+                        retry_after=args.retry_after)
+    if args.replay:
+        configure_logging(args.log_level, args.log_file)
+        try:
+            replay(api, args.replay, args.symbol, args.expiration, args.metrics_file, args.stream)
+        finally:
+            stop_logging()
+    else:
+        server = serve(api, port=args.port)
+        print(f"Serving on http://127.0.0.1:{server.server_port}{BASE_PATH} (set PUBLIC_API_BASE_URL to this)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -1,17 +1,36 @@
 import requests as r
 import os
 import logging
+import logging.handlers
+import queue
+import contextlib
+import contextvars
+import sys
 from dotenv import load_dotenv, dotenv_values
 import json
-from dataclasses import dataclass, field
+import copy
+from dataclasses import dataclass, field, replace
 import time
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 import re
 from datetime import date, datetime, timedelta, time as dt_time
 import uuid
-
-
+import random
+from email.utils import parsedate_to_datetime
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Sequence
+from bisect import bisect_left, bisect_right
+import functools
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+import numpy as np
 import pytz
+from requests.adapters import HTTPAdapter
 
 
 
@@ -20,6 +39,19 @@ import pytz
 load_dotenv()
 API_KEY = os.environ.get("API_KEY")
 ACCOUNT_ID = os.environ.get("ACCOUNT_ID")
+# override to point the bot at a stand-in (see fake_api.py)
+BASE_URL = os.environ.get("PUBLIC_API_BASE_URL", "https://api.public.com/userapigateway")
+
+# (connect, read) timeouts in seconds, per endpoint family
+DEFAULT_TIMEOUT = (3.05, 10)
+ENDPOINT_TIMEOUTS = {
+    "quotes": (3.05, 5),
+    "option-chain": (3.05, 10),
+    "greeks": (3.05, 5),
+    "preflight": (3.05, 10),
+    "order": (3.05, 10),
+    "portfolio": (3.05, 10),
+}
 
 
 
@@ -214,10 +246,10 @@ class Portfolio:
             # 100% loss or worse → auto-close
             if loss_pct <= -100.0:
                 self.close_spread(position)
-                if parse_option_symbol(position.instrument.symbol)['type'] == 'C':
-                    call_spreads_closed += 1
+                if parse_option_symbol(osi_symbol(position.instrument.symbol))['type'] == 'C':
+                    options_position_summary.call_spreads_closed += 1
                 else:
-                    put_spreads_closed += 1
+                    options_position_summary.put_spreads_closed += 1
 
 
             # 85% loss or worse → include in results
@@ -227,7 +259,7 @@ class Portfolio:
         return options_position_summary
 
     def close_spread(self, position: PortfolioPosition) -> None:
-        print("Closing Position")
+        log_event("close_position", "Closing Position", symbol=position.instrument.symbol)
 
 
 @dataclass
@@ -244,18 +276,22 @@ class Greeks:
 
     @staticmethod
     def from_dict(d: dict) -> "Greeks":
-        greeks = d["greeks"][0]
+        return Greeks.from_entry(d["greeks"][0])
+
+    @staticmethod
+    def from_entry(greeks: dict) -> "Greeks":
         g = greeks["greeks"]
+        symbol = "".join(greeks["symbol"].split())
 
         return Greeks(
-            symbol= "".join(greeks["symbol"].split()),
+            symbol=symbol,
             delta=float(g["delta"]),
             gamma=float(g["gamma"]),
             theta=float(g["theta"]),
             vega=float(g["vega"]),
             rho=float(g["rho"]),
             impliedVolatility=float(g["impliedVolatility"]),
-            strike = float(parse_option_symbol(greeks["symbol"])['strike'])
+            strike = float(parse_option_symbol(symbol)['strike'])
         )
 
 @dataclass
@@ -295,6 +331,54 @@ class Quote:
             volume=d["volume"], 
             openInterest=d["openInterest"], )
 
+    def to_dict(self) -> dict:
+        """Back to the quotes endpoint's entry shape."""
+        return {
+            "instrument": {"symbol": self.instrument.symbol, "type": self.instrument.type},
+            "outcome": self.outcome,
+            "last": self.last,
+            "lastTimestamp": self.lastTimestamp,
+            "bid": self.bid,
+            "bidSize": self.bidSize,
+            "bidTimestamp": self.bidTimestamp,
+            "ask": self.ask,
+            "askSize": self.askSize,
+            "askTimestamp": self.askTimestamp,
+            "volume": self.volume,
+            "openInterest": self.openInterest,
+        }
+
+class LazyQuoteList(Sequence):
+    """Keeps the raw chain entries and only builds a Quote the first time an index is read.
+    That saves decode time when a few strikes are read, not memory: the parsed entries stay alive
+    for as long as the chain does, which retains more than the eager list of Quotes.
+    """
+    def __init__(self, entries: List[dict]):
+        # own copy, patched quotes are written back into it and mustn't land in the caller's payload
+        self._entries = list(entries)
+        self._quotes: List[Optional[Quote]] = [None] * len(entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        quote = self._quotes[i]
+        if quote is None:
+            quote = Quote.from_dict(self._entries[i])
+            self._quotes[i] = quote
+        return quote
+
+    def __setitem__(self, i: int, quote: Quote) -> None:
+        self._quotes[i] = quote
+        # written back too, ColumnarOptionChain.from_chain reads the entries and must see patched quotes
+        self._entries[i] = quote.to_dict()
+
+    @property
+    def materialized_count(self) -> int:
+        return sum(q is not None for q in self._quotes)
+
 @dataclass
 class OptionChain:
     baseSymbol: str
@@ -302,20 +386,443 @@ class OptionChain:
     puts: List[Quote]
     call_strikes_count: int
     put_strikes_count: int
+    # sorted strikes, parallel to calls / puts
+    call_strikes: List[float] = field(default_factory=list)
+    put_strikes: List[float] = field(default_factory=list)
 
     @staticmethod 
-    def from_dict(d: dict) -> "OptionChain": 
+    def from_dict(d: dict, lazy: bool = False) -> "OptionChain": 
+        calls, call_strikes = OptionChain._sorted_side(d["calls"], lazy)
+        puts, put_strikes = OptionChain._sorted_side(d["puts"], lazy)
         return OptionChain( 
             baseSymbol=d["baseSymbol"], 
-            calls=[Quote.from_dict(q) for q in d["calls"]], 
-            puts=[Quote.from_dict(q) for q in d["puts"]],
-            call_strikes_count = len(d["calls"]),
-            put_strikes_count = len(d["calls"]) )
+            calls=calls, 
+            puts=puts,
+            call_strikes_count = len(calls),
+            put_strikes_count = len(puts),
+            call_strikes = call_strikes,
+            put_strikes = put_strikes )
+
+    @staticmethod
+    def _sorted_side(entries: List[dict], lazy: bool = False):
+        strikes = [option_strike(e["instrument"]["symbol"]) for e in entries]
+        if any(strikes[i] > strikes[i + 1] for i in range(len(strikes) - 1)):
+            order = sorted(range(len(entries)), key=strikes.__getitem__)
+            entries = [entries[i] for i in order]
+            strikes = [strikes[i] for i in order]
+        if lazy:
+            return LazyQuoteList(entries), strikes
+        return [Quote.from_dict(e) for e in entries], strikes
+
+    def refresh_quotes(self, d: dict) -> bool:
+        """Swap in new quotes if the payload lists exactly the same strikes, keeping the strike index.
+        Returns False (and leaves the chain alone) when the structure changed and a full rebuild is needed.
+        """
+        call_strikes = [option_strike(e["instrument"]["symbol"]) for e in d["calls"]]
+        put_strikes = [option_strike(e["instrument"]["symbol"]) for e in d["puts"]]
+        if call_strikes != self.call_strikes or put_strikes != self.put_strikes:
+            return False
+        lazy = isinstance(self.calls, LazyQuoteList)
+        if lazy:
+            self.calls = LazyQuoteList(d["calls"])
+            self.puts = LazyQuoteList(d["puts"])
+        else:
+            self.calls = [Quote.from_dict(e) for e in d["calls"]]
+            self.puts = [Quote.from_dict(e) for e in d["puts"]]
+        return True
+
+    def patch_quote(self, quote: Quote) -> bool:
+        """Replace the quote at its strike in place, False if the symbol isn't on this chain."""
+        symbol = quote.instrument.symbol
+        option_type = "CALL" if symbol[-9] == "C" else "PUT"
+        strikes = self.strikes(option_type)
+        strike = option_strike(symbol)
+        i = bisect_left(strikes, strike)
+        if i == len(strikes) or strikes[i] != strike:
+            return False
+        self.quotes(option_type)[i] = quote
+        return True
+
+    def strikes(self, option_type: str = "CALL") -> List[float]:
+        return self.put_strikes if option_type == "PUT" else self.call_strikes
+
+    def quotes(self, option_type: str = "CALL") -> List[Quote]:
+        return self.puts if option_type == "PUT" else self.calls
+
+    def atm_index(self, price: float, option_type: str = "CALL") -> int:
+        """ATM call is the lowest strike at or above price, ATM put the highest strike at or below it."""
+        strikes = self.strikes(option_type)
+        if option_type == "PUT":
+            return max(bisect_right(strikes, price) - 1, 0)
+        return min(bisect_left(strikes, price), len(strikes) - 1)
+
+    def index_of_strike(self, strike: float, option_type: str = "CALL") -> int:
+        strikes = self.strikes(option_type)
+        i = bisect_left(strikes, strike)
+        if i == len(strikes) or strikes[i] != strike:
+            raise ValueError(f"{option_type} strike {strike} not in {self.baseSymbol} chain")
+        return i
+
+    def strike_at(self, index: int, option_type: str = "CALL") -> float:
+        return self.strikes(option_type)[index]
+
+# -----------------------------
+# Columnar option chain
+# -----------------------------
+
+def _to_datetime64(ts: Optional[str]) -> np.datetime64:
+    if not ts:
+        return np.datetime64("NaT", "s")
+    # numpy only parses naive timestamps, all API timestamps are UTC
+    return np.datetime64(ts.rstrip("Z"), "s")
+
+def _from_datetime64(ts: np.datetime64) -> Optional[str]:
+    if np.isnat(ts):
+        return None
+    return f"{np.datetime_as_string(ts, unit='s')}Z"
+
+# sizes / volume / OI come back null for some strikes, kept as -1 so rows round-trip to None
+MISSING_INT = -1
+
+def _int_column(values) -> np.ndarray:
+    return np.array([MISSING_INT if v is None else v for v in values], dtype=np.int64)
+
+def _from_int(v: np.int64) -> Optional[int]:
+    return None if v == MISSING_INT else int(v)
+
+
+class ChainColumns:
+    """One side (calls or puts) of a chain stored as contiguous columns, sorted by strike."""
+    def __init__(self, symbols: List[str], outcomes: List[str], columns: Dict[str, np.ndarray]):
+        self.symbols = symbols
+        self.outcomes = outcomes
+        self.strike = columns["strike"]
+        self.last = columns["last"]
+        self.bid = columns["bid"]
+        self.ask = columns["ask"]
+        self.bid_size = columns["bid_size"]
+        self.ask_size = columns["ask_size"]
+        self.volume = columns["volume"]
+        self.open_interest = columns["open_interest"]
+        self.last_timestamp = columns["last_timestamp"]
+        self.bid_timestamp = columns["bid_timestamp"]
+        self.ask_timestamp = columns["ask_timestamp"]
+
+    @staticmethod
+    def from_dicts(entries: List[dict]) -> "ChainColumns":
+        symbols = [q["instrument"]["symbol"] for q in entries]
+        columns = {
+            "strike": np.array([option_strike(s) for s in symbols], dtype=np.float64),
+            "last": np.array([q["last"] for q in entries], dtype=np.float64),
+            "bid": np.array([q["bid"] for q in entries], dtype=np.float64),
+            "ask": np.array([q["ask"] for q in entries], dtype=np.float64),
+            "bid_size": _int_column(q["bidSize"] for q in entries),
+            "ask_size": _int_column(q["askSize"] for q in entries),
+            "volume": _int_column(q["volume"] for q in entries),
+            "open_interest": _int_column(q["openInterest"] for q in entries),
+            "last_timestamp": np.array([_to_datetime64(q["lastTimestamp"]) for q in entries], dtype="datetime64[s]"),
+            "bid_timestamp": np.array([_to_datetime64(q["bidTimestamp"]) for q in entries], dtype="datetime64[s]"),
+            "ask_timestamp": np.array([_to_datetime64(q["askTimestamp"]) for q in entries], dtype="datetime64[s]"),
+        }
+        return ChainColumns._sorted(symbols, [q["outcome"] for q in entries], columns)
+
+    @staticmethod
+    def from_quotes(quotes: List[Quote]) -> "ChainColumns":
+        symbols = [q.instrument.symbol for q in quotes]
+        columns = {
+            "strike": np.array([option_strike(s) for s in symbols], dtype=np.float64),
+            "last": np.array([q.last for q in quotes], dtype=np.float64),
+            "bid": np.array([q.bid for q in quotes], dtype=np.float64),
+            "ask": np.array([q.ask for q in quotes], dtype=np.float64),
+            "bid_size": _int_column(q.bidSize for q in quotes),
+            "ask_size": _int_column(q.askSize for q in quotes),
+            "volume": _int_column(q.volume for q in quotes),
+            "open_interest": _int_column(q.openInterest for q in quotes),
+            "last_timestamp": np.array([_to_datetime64(q.lastTimestamp) for q in quotes], dtype="datetime64[s]"),
+            "bid_timestamp": np.array([_to_datetime64(q.bidTimestamp) for q in quotes], dtype="datetime64[s]"),
+            "ask_timestamp": np.array([_to_datetime64(q.askTimestamp) for q in quotes], dtype="datetime64[s]"),
+        }
+        return ChainColumns._sorted(symbols, [q.outcome for q in quotes], columns)
+
+    @staticmethod
+    def _sorted(symbols: List[str], outcomes: List[str], columns: Dict[str, np.ndarray]) -> "ChainColumns":
+        strike = columns["strike"]
+        if strike.size > 1 and np.any(strike[1:] < strike[:-1]):
+            order = np.argsort(strike, kind="stable")
+            columns = {name: col[order] for name, col in columns.items()}
+            symbols = [symbols[i] for i in order]
+            outcomes = [outcomes[i] for i in order]
+        return ChainColumns(symbols, outcomes, columns)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def row(self, i: int) -> Quote:
+        """Materialize one strike as a regular Quote."""
+        return Quote(
+            instrument=Instrument(symbol=self.symbols[i], type="OPTION"),
+            outcome=self.outcomes[i],
+            last=float(self.last[i]),
+            lastTimestamp=_from_datetime64(self.last_timestamp[i]),
+            bid=float(self.bid[i]),
+            bidSize=_from_int(self.bid_size[i]),
+            bidTimestamp=_from_datetime64(self.bid_timestamp[i]),
+            ask=float(self.ask[i]),
+            askSize=_from_int(self.ask_size[i]),
+            askTimestamp=_from_datetime64(self.ask_timestamp[i]),
+            volume=_from_int(self.volume[i]),
+            openInterest=_from_int(self.open_interest[i]),
+        )
+
+    def rows(self, mask_or_indices) -> List[Quote]:
+        indices = np.flatnonzero(mask_or_indices) if np.asarray(mask_or_indices).dtype == bool else mask_or_indices
+        return [self.row(int(i)) for i in indices]
+
+    def mid(self) -> np.ndarray:
+        return (self.bid + self.ask) / 2
+
+    def spread_width(self) -> np.ndarray:
+        return self.ask - self.bid
+
+    def liquid_mask(self, max_spread: float = 0.10, min_size: int = 1, min_open_interest: int = 0) -> np.ndarray:
+        return (
+            (self.bid > 0)
+            & (self.spread_width() <= max_spread)
+            & (self.bid_size >= min_size)
+            & (self.ask_size >= min_size)
+            & self.open_interest_at_least(min_open_interest)
+        )
+
+    def open_interest_at_least(self, min_open_interest: int) -> np.ndarray:
+        # null OI (MISSING_INT) is unknown rather than zero, those strikes aren't filtered out on it
+        return (self.open_interest == MISSING_INT) | (self.open_interest >= min_open_interest)
+
+    def within(self, spot: float, dollars: float) -> np.ndarray:
+        return np.abs(self.strike - spot) <= dollars
+
+
+@dataclass
+class ColumnarOptionChain:
+    baseSymbol: str
+    calls: ChainColumns
+    puts: ChainColumns
+
+    @staticmethod
+    def from_dict(d: dict) -> "ColumnarOptionChain":
+        return ColumnarOptionChain(
+            baseSymbol=d["baseSymbol"],
+            calls=ChainColumns.from_dicts(d["calls"]),
+            puts=ChainColumns.from_dicts(d["puts"]),
+        )
+
+    @staticmethod
+    def from_chain(chain: OptionChain) -> "ColumnarOptionChain":
+        # a lazy chain still has its raw entries, read those rather than materializing every Quote
+        if isinstance(chain.calls, LazyQuoteList) and isinstance(chain.puts, LazyQuoteList):
+            return ColumnarOptionChain(
+                baseSymbol=chain.baseSymbol,
+                calls=ChainColumns.from_dicts(chain.calls._entries),
+                puts=ChainColumns.from_dicts(chain.puts._entries),
+            )
+        return ColumnarOptionChain(
+            baseSymbol=chain.baseSymbol,
+            calls=ChainColumns.from_quotes(chain.calls),
+            puts=ChainColumns.from_quotes(chain.puts),
+        )
+
+    def side(self, option_type: str = "CALL") -> ChainColumns:
+        return self.puts if option_type == "PUT" else self.calls
+
+    def parity_spot(self) -> float:
+        """Underlying price implied by put-call parity at the strike where call and put mids are closest."""
+        call_mid = self.calls.mid()
+        put_mid = self.puts.mid()
+        i = int(np.argmin(np.abs(call_mid - put_mid)))
+        return float(self.calls.strike[i] + call_mid[i] - put_mid[i])
+
+    def strikes_near(self, spot: float, dollars: float, option_type: str = "CALL") -> np.ndarray:
+        side = self.side(option_type)
+        return side.strike[side.within(spot, dollars)]
+
+
+def underlying_stub(symbol: str, last: float) -> Quote:
+    """Underlying quote carrying only a last price, for pricing a recorded chain that doesn't include one."""
+    return Quote(Instrument(symbol, "EQUITY"), "SUCCESS", last, None, 0.0, 0, None, 0.0, 0, None, 0, 0)
+
+def chain_spot_quote(chain: OptionChain) -> Quote:
+    """underlying_stub at the chain's put-call parity spot."""
+    return underlying_stub(chain.baseSymbol, ColumnarOptionChain.from_chain(chain).parity_spot())
+
+def morning_of_expiry(option_symbol: str) -> datetime:
+    """10am Eastern on the OSI symbol's expiration day, late enough to price 0DTE but not so late every delta is 0 or 1."""
+    expiration = datetime.strptime(option_symbol[-15:-9], "%y%m%d")
+    return eastern.localize(expiration.replace(hour=10)).astimezone(pytz.utc)
+
+
+# -----------------------------
+# Compact decoding
+# -----------------------------
+
+def to_cents(value) -> Optional[int]:
+    """API decimal string as an integer count of hundredths (cents for prices, basis points for percentages).
+    Exact for the two decimal values the API sends, anything finer is rounded to the nearest hundredth.
+    """
+    if value is None:
+        return None
+    return round(float(value) * 100)
+
+def format_cents(cents: int) -> str:
+    """Cents back to the API's decimal string, without going through a float."""
+    sign = "-" if cents < 0 else ""
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+@dataclass(slots=True)
+class CompactQuote:
+    symbol: str
+    type: str
+    # cents
+    last: Optional[int]
+    bid: Optional[int]
+    ask: Optional[int]
+    bid_size: Optional[int]
+    ask_size: Optional[int]
+    volume: Optional[int]
+    open_interest: Optional[int]
+
+    @property
+    def mid(self) -> Optional[float]:
+        if self.bid is None or self.ask is None:
+            return None
+        return (self.bid + self.ask) / 2
+
+@dataclass(slots=True)
+class CompactPosition:
+    symbol: str
+    type: str
+    quantity: float
+    # cents
+    last_price: Optional[int]
+    current_value: Optional[int]
+    gain_value: Optional[int]
+    unit_cost: Optional[int]
+    total_cost: Optional[int]
+    # basis points, -7541 is -75.41%
+    gain_bp: Optional[int]
+
+@dataclass(slots=True)
+class CompactPortfolio:
+    account_id: str
+    account_type: str
+    # cents
+    buying_power: int
+    options_buying_power: int
+    positions: tuple
+
+
+# per struct, (path into the response object, converter) for each field in declaration order.
+# Only these paths are read, timestamps and the rest of the payload are never touched.
+SCHEMAS = {
+    CompactQuote: (
+        (("instrument", "symbol"), None),
+        (("instrument", "type"), None),
+        (("last",), to_cents),
+        (("bid",), to_cents),
+        (("ask",), to_cents),
+        (("bidSize",), None),
+        (("askSize",), None),
+        (("volume",), None),
+        (("openInterest",), None),
+    ),
+    CompactPosition: (
+        (("instrument", "symbol"), None),
+        (("instrument", "type"), None),
+        (("quantity",), float),
+        (("lastPrice", "lastPrice"), to_cents),
+        (("currentValue",), to_cents),
+        (("instrumentGain", "gainValue"), to_cents),
+        (("costBasis", "unitCost"), to_cents),
+        (("costBasis", "totalCost"), to_cents),
+        (("instrumentGain", "gainPercentage"), to_cents),
+    ),
+    CompactPortfolio: (
+        (("accountId",), None),
+        (("accountType",), None),
+        (("buyingPower", "buyingPower"), to_cents),
+        (("buyingPower", "optionsBuyingPower"), to_cents),
+        (("positions",), lambda items: decode_many(CompactPosition, items)),
+    ),
+}
+
+_EMPTY: dict = {}
+
+def _build_decoder(cls, schema) -> Callable[[dict], object]:
+    """Resolve a schema once into the nested objects to look up and the (object, key, converter) to read
+    for each field, so decoding is a handful of dict lookups and one constructor call.
+    """
+    # (index of the object it's read from, key) per nested object, index 0 is the object being decoded
+    parents = []
+    parent_index = {}
+    fields = []
+    for path, convert in schema:
+        source = 0
+        for depth in range(1, len(path)):
+            prefix = path[:depth]
+            if prefix not in parent_index:
+                parents.append((source, prefix[-1]))
+                parent_index[prefix] = len(parents)
+            source = parent_index[prefix]
+        fields.append((source, path[-1], convert))
+    parents = tuple(parents)
+    fields = tuple(fields)
+
+    def decoder(d: dict):
+        objects = [d]
+        for source, key in parents:
+            # each nested object is looked up once, missing / null ones read as empty
+            objects.append(objects[source].get(key) or _EMPTY)
+        values = []
+        for source, key, convert in fields:
+            v = objects[source].get(key)
+            values.append(v if v is None or convert is None else convert(v))
+        return cls(*values)
+    return decoder
+
+_decoders = {cls: _build_decoder(cls, schema) for cls, schema in SCHEMAS.items()}
+
+def decode(cls, d: dict):
+    """Build cls from a parsed response object, reading only the fields in its schema."""
+    return _decoders[cls](d)
+
+def decode_many(cls, items: List[dict]) -> tuple:
+    decoder = _decoders[cls]
+    return tuple([decoder(item) for item in items])
+
+def decode_json(cls, raw: bytes, key: Optional[str] = None):
+    """Response body (e.g. response.content) straight to cls. With key, decodes every object
+    in that list instead, e.g. decode_json(CompactQuote, body, "quotes").
+    """
+    d = json.loads(raw)
+    if key is not None:
+        return decode_many(cls, d[key])
+    return decode(cls, d)
+
+
+@dataclass
+class LegTiming:
+    stage: str
+    call_ms: float
+    put_ms: float
+    # gap between the two legs finishing, how far apart they were priced / filled
+    skew_ms: float
 
 @dataclass
 class IronCondor:
     call_credit_spread: CreditSpread
     put_credit_spread: CreditSpread
+    timings: List[LegTiming] = field(default_factory=list)
+    # perf_counter() when the underlying quote it was priced from arrived
+    quote_received: Optional[float] = None
 
 class LastTrade:
     def __init__(self):
@@ -324,37 +831,751 @@ class LastTrade:
         self.last_symbol = None
 
 
-def get_quote(instrument: Instrument, account_id: str, api_key: str) -> Quote:
-    url = f"https://api.public.com/userapigateway/marketdata/{account_id}/quotes"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+# -----------------------------
+# Metrics
+# -----------------------------
 
-    request_body = {
-        "instruments": [
-            {
-            "symbol": instrument.symbol,
-            "type": instrument.type
-            }
-        ]
-    }   
-    response = r.post(url, headers=headers, json=request_body)
-    data = response.json()
+# seconds, from a cached greeks lookup up to a slow order ack
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# bytes, from a single quote up to a full chain
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0]
+                self._series[label_values] = series
+            series[0][i] += 1
+            series[1] += value
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    bucket_labels = _format_labels(self.labels, label_values, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total:g}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """In-process counters and histograms, exported in the Prometheus text format either as a
+    file (for node_exporter's textfile collector) or from a small local HTTP endpoint.
+    """
+    def __init__(self):
+        self.metrics = []
+        self._write_lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        # write then rename, so a scrape never reads a half written file
+        with self._write_lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                data = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+
+metrics = MetricsRegistry()
+api_request_seconds = metrics.histogram("meic_api_request_seconds", "HTTP round trip per endpoint", ("endpoint",))
+api_requests_total = metrics.counter("meic_api_requests_total", "Requests per endpoint by status code, or exception name when there was no response", ("endpoint", "status"))
+api_retries_total = metrics.counter("meic_api_retries_total", "Retries made before the final response", ("endpoint",))
+api_throttle_seconds = metrics.histogram("meic_api_throttle_seconds", "Time spent waiting on the endpoint family's rate limiter", ("endpoint",))
+api_coalesced_total = metrics.counter("meic_api_coalesced_total", "Requests answered by an identical one already in flight", ("endpoint",))
+api_request_bytes = metrics.histogram("meic_api_request_bytes", "Request body size", ("endpoint",), SIZE_BUCKETS)
+api_response_bytes = metrics.histogram("meic_api_response_bytes", "Response body size", ("endpoint",), SIZE_BUCKETS)
+call_seconds = metrics.histogram("meic_call_seconds", "API wrapper time including cache lookups and decoding", ("function", "outcome"))
+quote_failures_total = metrics.counter("meic_quote_failures_total", "Instruments the quotes endpoint answered without a SUCCESS outcome", ("outcome",))
+quote_to_order_seconds = metrics.histogram("meic_quote_to_order_seconds", "Underlying quote received to both iron condor spreads submitted", ("underlying",))
+
+# node_exporter textfile path rewritten after every cycle, and/or a port to serve /metrics on
+METRICS_FILE = os.environ.get("MEIC_METRICS_FILE")
+METRICS_PORT = os.environ.get("MEIC_METRICS_PORT")
+
+def instrumented(fn):
+    """Time every call of an API wrapper into meic_call_seconds."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            call_seconds.observe(time.perf_counter() - start, fn.__name__, outcome)
+    return wrapper
 
-    quotes = [Quote.from_dict(q) for q in data["quotes"]]
-    return quotes[0]
 
+# -----------------------------
+# Event log
+# -----------------------------
+# Everything the strategy reports goes through log_event onto a bounded queue. A listener thread
+# does the formatting and the terminal / file writes, so a slow disk or terminal never holds up
+# a cycle, and when the queue is full events are dropped (and counted) rather than waited on.
 
+log = logging.getLogger("meic")
+# swallows events (warnings included) until configure_logging, instead of logging's last resort stderr handler
+log.addHandler(logging.NullHandler())
+log_dropped_total = metrics.counter("meic_log_dropped_total", "Log events dropped because the log queue was full")
 
+LOG_LEVEL = os.environ.get("MEIC_LOG_LEVEL", "INFO")
+# JSON lines file, one event per line, on top of the console
+LOG_FILE = os.environ.get("MEIC_LOG_FILE")
+LOG_QUEUE_SIZE = 10000
+# cycles whose events are kept in memory by the RecentCycles buffer
+LOG_RECENT_CYCLES = 50
 
 
-def get_option_chain(instrument: Instrument, account_id: str, api_key: str, expiration_date: str) -> OptionChain:
-    url = f"https://api.public.com/userapigateway/marketdata/{account_id}/option-chain"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
+@dataclass
+class CycleContext:
+    id: str
+    strategy: str
+    # perf_counter() when the cycle started, every event carries its ms since then
+    start: float
+
+_cycle: contextvars.ContextVar[Optional[CycleContext]] = contextvars.ContextVar("meic_cycle", default=None)
+# a ContextVar of its own so the concurrent call and put legs each report their own stage
+_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("meic_stage", default=None)
+
+@contextlib.contextmanager
+def cycle_context(strategy: str):
+    """Tag every event logged inside (including from asyncio.to_thread and run_legs_concurrently workers) with a new cycle id."""
+    token = _cycle.set(CycleContext(uuid.uuid4().hex[:12], strategy, time.perf_counter()))
+    try:
+        yield
+    finally:
+        _cycle.reset(token)
+
+@contextlib.contextmanager
+def stage(name: str):
+    """Tag events with the stage they happened in, and log how long the stage took."""
+    token = _stage.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        log_event("stage_done", level=logging.DEBUG, duration_ms=round((time.perf_counter() - start) * 1000, 3))
+        _stage.reset(token)
+
+def log_event(event: str, message: Optional[str] = None, level: int = logging.INFO, **fields) -> None:
+    """Queue one structured event. message is the human readable line (event itself when omitted),
+    fields go into the JSON record as they are and are only serialized on the writer thread.
+    """
+    if log.isEnabledFor(level):
+        log.log(level, message or event, extra={"event": event, "fields": fields})
+
+def submit_in_context(executor: ThreadPoolExecutor, fn, *args) -> Future:
+    """executor.submit that carries the caller's cycle and stage over to the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+class CycleFilter(logging.Filter):
+    """Stamps records with the cycle and stage of the thread logging them, before they are queued."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        cycle = _cycle.get()
+        record.cycle = cycle.id if cycle is not None else None
+        record.strategy = cycle.strategy if cycle is not None else None
+        record.elapsed_ms = round((time.perf_counter() - cycle.start) * 1000, 3) if cycle is not None else None
+        record.stage = _stage.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # formatting is the listener's job, only merge args so the record is safe to hand over
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_dropped_total.inc()
+
+
+class EventLogListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # the writer is still draining, so waiting for room here always ends (put_nowait could hit a full queue)
+        self.queue.put(self._sentinel)
+
+
+def event_dict(record: logging.LogRecord) -> dict:
+    event = {
+        "ts": datetime.fromtimestamp(record.created, pytz.utc).isoformat(timespec="milliseconds"),
+        "level": record.levelname,
+        "event": getattr(record, "event", None) or record.name,
+        "message": record.getMessage(),
+        "cycle": getattr(record, "cycle", None),
+        "strategy": getattr(record, "strategy", None),
+        "stage": getattr(record, "stage", None),
+        "elapsed_ms": getattr(record, "elapsed_ms", None),
+        "thread": record.threadName,
     }
+    event.update(getattr(record, "fields", None) or {})
+    return event
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(event_dict(record), default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """The message alone, prefixed with the strategy and stage when there is one."""
+    def format(self, record: logging.LogRecord) -> str:
+        prefix = " ".join(p for p in (getattr(record, "strategy", None), getattr(record, "stage", None)) if p)
+        return f"[{prefix}] {record.getMessage()}" if prefix else record.getMessage()
+
+
+class RecentCycles(logging.Handler):
+    """The events of the last max_cycles cycles, in memory, for looking at what just happened
+    (events outside any cycle are kept under None, capped at max_events like every cycle).
+    """
+    def __init__(self, max_cycles: int = LOG_RECENT_CYCLES, max_events: int = 1000):
+        super().__init__()
+        self.max_cycles = max_cycles
+        self.max_events = max_events
+        self._cycles: "OrderedDict[Optional[str], deque]" = OrderedDict()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        event = event_dict(record)
+        cycle = event["cycle"]
+        with self.lock:
+            events = self._cycles.get(cycle)
+            if events is None:
+                events = self._cycles[cycle] = deque(maxlen=self.max_events)
+                while len(self._cycles) > self.max_cycles:
+                    self._cycles.popitem(last=False)
+            events.append(event)
+
+    def cycles(self) -> List[Optional[str]]:
+        with self.lock:
+            return list(self._cycles)
+
+    def events(self, cycle: Optional[str] = None) -> List[dict]:
+        with self.lock:
+            return list(self._cycles.get(cycle, ()))
+
+
+recent_cycles = RecentCycles()
+_log_listener: Optional[EventLogListener] = None
+
+def configure_logging(level: str = LOG_LEVEL, path: Optional[str] = LOG_FILE, console: bool = True) -> EventLogListener:
+    """Route the meic logger through the queue to the console, the JSON lines file (if any) and recent_cycles.
+    Until this is called nothing is written, so importing the module stays quiet.
+    """
+    global _log_listener
+    stop_logging()
+    handlers: List[logging.Handler] = [recent_cycles]
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+    if path:
+        file_handler = logging.FileHandler(path)
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(CycleFilter())
+    log.handlers = [queue_handler]
+    log.setLevel(level)
+    log.propagate = False
+    _log_listener = EventLogListener(queue_handler.queue, *handlers)
+    _log_listener.start()
+    return _log_listener
+
+def stop_logging() -> None:
+    """Write out whatever is still queued and stop the writer thread."""
+    global _log_listener
+    if _log_listener is not None:
+        # back to swallowing, rather than filling a queue nobody drains
+        log.handlers = [logging.NullHandler()]
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            if isinstance(handler, logging.FileHandler):
+                handler.close()
+        _log_listener = None
+
+
+# -----------------------------
+# Rate limiting and retries
+# -----------------------------
+
+# (requests per second, burst) per endpoint family, for each API key
+DEFAULT_RATE_LIMIT = (5, 10)
+RATE_LIMITS = {
+    "quotes": (10, 20),
+    "option-chain": (2, 4),
+    "greeks": (10, 20),
+    "preflight": (5, 10),
+    "order": (5, 10),
+    "portfolio": (2, 4),
+}
+# seconds a whole call may take, throttling and retries included
+DEFAULT_DEADLINE = 15
+ENDPOINT_DEADLINES = {
+    "quotes": 5,
+    "option-chain": 15,
+    "greeks": 5,
+    "preflight": 10,
+    "order": 10,
+    "portfolio": 10,
+}
+# read-only families, identical requests in flight at the same time share one response
+COALESCED_ENDPOINTS = {"quotes", "option-chain", "greeks", "portfolio"}
+# submitting twice could open twice, so orders are only retried when the API can't have acted on them
+UNSAFE_TO_RETRY = {"order"}
+
+
+class ApiError(RuntimeError):
+    def __init__(self, endpoint: str, message: str, status_code: Optional[int] = None):
+        super().__init__(f"{endpoint}: {message}" + (f" (status {status_code})" if status_code is not None else ""))
+        self.endpoint = endpoint
+        self.status_code = status_code
+
+class DeadlineExceeded(ApiError):
+    pass
+
+class OrderOutcomeUnknown(ApiError):
+    """A submit failed in a way that doesn't say whether the order reached the book (5xx, read timeout,
+    or one wing of two failing). Callers treat the trade as entered and let the portfolio show what filled.
+    """
+    pass
+
+
+def response_json(response: r.Response, endpoint: str) -> dict:
+    """Body of a successful response, ApiError for anything else."""
+    if not response.ok:
+        raise ApiError(endpoint, response.text, response.status_code)
+    try:
+        return response.json()
+    except ValueError:
+        raise ApiError(endpoint, f"API did not return JSON. Body={response.text}", response.status_code)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint: str, deadline: float) -> float:
+        """Take a token, waiting for one to free up. Returns seconds waited, DeadlineExceeded if that's past deadline."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise DeadlineExceeded(endpoint, f"rate limited past the deadline after waiting {waited:.2f}s")
+            self.sleep(wait)
+            waited += wait
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 4
+    base_delay: float = 0.25
+    max_delay: float = 4.0
+    retry_statuses: frozenset = frozenset({429, 500, 502, 503, 504})
+
+    def delay(self, attempt: int, retry_after: Optional[float], rng: random.Random) -> float:
+        """Full-jitter exponential backoff, never sooner than the server's Retry-After."""
+        backoff = rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return backoff if retry_after is None else max(retry_after, backoff)
+
+
+def retry_after_seconds(response: r.Response, clock=time.time) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        # the HTTP-date form
+        return max(parsedate_to_datetime(value).timestamp() - clock(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class SingleFlight:
+    """Concurrent calls with the same key wait for the first one's result instead of repeating it."""
+    def __init__(self):
+        self._calls: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: tuple, fn):
+        """Returns (result, shared), shared is True when another caller's request answered this one."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+# -----------------------------
+# Pooled API client
+# -----------------------------
+
+@dataclass
+class ConnectionStats:
+    requests_sent: int
+    connections_opened: int
+
+    @property
+    def connections_reused(self) -> int:
+        return max(self.requests_sent - self.connections_opened, 0)
+
+    @property
+    def reuse_ratio(self) -> float:
+        if self.requests_sent == 0:
+            return 0.0
+        return self.connections_reused / self.requests_sent
+
+
+class ApiClient:
+    """One keep-alive session per API key: auth headers, base URL and timeouts are built once
+    and every wrapper below sends through the same connection pool.
+
+    Every request also goes through its endpoint family's token bucket, is retried on 429/5xx and
+    connection failures with jittered backoff (honoring Retry-After) until its deadline, and
+    identical read requests already in flight are joined instead of sent again.
+    """
+    def __init__(self, api_key: str, base_url: str = BASE_URL, timeouts: Optional[Dict[str, tuple]] = None, pool_maxsize: int = 10,
+                 rate_limits: Optional[Dict[str, tuple]] = None, retry_policy: Optional[RetryPolicy] = None,
+                 clock=time.monotonic, sleep=time.sleep, seed: Optional[int] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = dict(ENDPOINT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.rate_limits = dict(RATE_LIMITS)
+        if rate_limits:
+            self.rate_limits.update(rate_limits)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.clock = clock
+        self.sleep = sleep
+        self.random = random.Random(seed)
+        self.single_flight = SingleFlight()
+        self._limiters: Dict[str, TokenBucket] = {}
+
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session = r.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
+        })
+
+        self._lock = threading.Lock()
+        self._requests_sent = 0
+
+    def limiter(self, endpoint: str) -> TokenBucket:
+        with self._lock:
+            limiter = self._limiters.get(endpoint)
+            if limiter is None:
+                rate, burst = self.rate_limits.get(endpoint, DEFAULT_RATE_LIMIT)
+                limiter = TokenBucket(rate, burst, clock=self.clock, sleep=self.sleep)
+                self._limiters[endpoint] = limiter
+            return limiter
+
+    def request(self, method: str, endpoint: str, path: str, deadline: Optional[float] = None, **kwargs) -> r.Response:
+        """deadline is seconds from now for the whole call, ENDPOINT_DEADLINES by default. Returns the final
+        response, which can still be an error status once retries or the deadline run out.
+        """
+        deadline = self.clock() + (deadline if deadline is not None else ENDPOINT_DEADLINES.get(endpoint, DEFAULT_DEADLINE))
+        if endpoint not in COALESCED_ENDPOINTS:
+            return self._send_with_retries(method, endpoint, path, deadline, kwargs)
+        key = (method, path, json.dumps(kwargs.get("params"), sort_keys=True), json.dumps(kwargs.get("json"), sort_keys=True))
+        response, shared = self.single_flight.do(key, lambda: self._send_with_retries(method, endpoint, path, deadline, kwargs))
+        if shared:
+            api_coalesced_total.inc(endpoint)
+        return response
+
+    def _retryable(self, endpoint: str, response: Optional[r.Response], error: Optional[Exception]) -> bool:
+        if error is not None:
+            # a connect timeout never reached the server, anything later might have
+            return endpoint not in UNSAFE_TO_RETRY or isinstance(error, r.exceptions.ConnectTimeout)
+        if endpoint in UNSAFE_TO_RETRY:
+            return response.status_code == 429
+        return response.status_code in self.retry_policy.retry_statuses
+
+    def _send_with_retries(self, method: str, endpoint: str, path: str, deadline: float, kwargs: dict) -> r.Response:
+        connect_timeout, read_timeout = kwargs.pop("timeout", None) or self.timeouts.get(endpoint, DEFAULT_TIMEOUT)
+        attempt = 0
+        while True:
+            throttled = self.limiter(endpoint).acquire(endpoint, deadline)
+            if throttled:
+                api_throttle_seconds.observe(throttled, endpoint)
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                raise DeadlineExceeded(endpoint, f"deadline passed after {attempt} attempts")
+            # an attempt can't outlive the call's deadline
+            timeout = (min(connect_timeout, remaining), min(read_timeout, remaining))
+            response, error = None, None
+            try:
+                response = self._send(method, endpoint, path, timeout=timeout, **kwargs)
+            except r.RequestException as e:
+                error = e
+            if not self._retryable(endpoint, response, error):
+                if error is not None:
+                    raise error
+                return response
+
+            attempt += 1
+            delay = self.retry_policy.delay(attempt - 1, retry_after_seconds(response) if response is not None else None, self.random)
+            if attempt >= self.retry_policy.max_attempts:
+                if error is not None:
+                    raise error
+                return response
+            if self.clock() + delay >= deadline:
+                if error is not None:
+                    raise DeadlineExceeded(endpoint, f"no time left to retry {error!r}") from error
+                return response
+            api_retries_total.inc(endpoint)
+            self.sleep(delay)
+
+    def _send(self, method: str, endpoint: str, path: str, **kwargs) -> r.Response:
+        with self._lock:
+            self._requests_sent += 1
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}/{path}", **kwargs)
+        except r.RequestException as e:
+            api_request_seconds.observe(time.perf_counter() - start, endpoint)
+            api_requests_total.inc(endpoint, type(e).__name__)
+            raise
+        api_request_seconds.observe(time.perf_counter() - start, endpoint)
+        api_requests_total.inc(endpoint, str(response.status_code))
+        api_request_bytes.observe(len(response.request.body or b""), endpoint)
+        api_response_bytes.observe(len(response.content), endpoint)
+        # urllib3 keeps the attempts it retried on the raw response (none unless the adapter is given max_retries)
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None and retries.history:
+            api_retries_total.inc(endpoint, amount=len(retries.history))
+        return response
+
+    def get(self, endpoint: str, path: str, params: Optional[dict] = None, deadline: Optional[float] = None) -> r.Response:
+        return self.request("GET", endpoint, path, deadline=deadline, params=params)
+
+    def post(self, endpoint: str, path: str, json: Optional[dict] = None, deadline: Optional[float] = None) -> r.Response:
+        return self.request("POST", endpoint, path, deadline=deadline, json=json)
+
+    def connection_stats(self) -> ConnectionStats:
+        # urllib3 counts every new socket per host pool, so anything below requests_sent was a reused connection
+        pools = self.adapter.poolmanager.pools
+        opened = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+        return ConnectionStats(requests_sent=self._requests_sent, connections_opened=opened)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_clients: Dict[str, ApiClient] = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_key: str, pool_maxsize: int = 10, base_url: str = BASE_URL) -> ApiClient:
+    """Shared client for api_key, pool_maxsize and base_url only apply when the client is first created."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = ApiClient(api_key, base_url=base_url, pool_maxsize=pool_maxsize)
+            _clients[api_key] = client
+        return client
+
+
+
+# most instruments sent in one quotes request, longer lists are split and the chunks sent concurrently
+QUOTES_BATCH_SIZE = 50
+# chunks of one get_quotes call in flight at once, own pool so callers on leg_executor can't starve it
+quote_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="quotes")
+
+@instrumented
+def get_quote(instrument: Instrument, account_id: str, api_key: str) -> Quote:
+    quote = get_quotes([instrument], account_id, api_key).get(instrument.symbol)
+    if quote is None:
+        raise ApiError("quotes", f"no quote returned for {instrument.symbol}")
+    return quote
+
+def _request_quotes(instruments: List[Instrument], account_id: str, api_key: str) -> List[dict]:
+    client = get_client(api_key)
+    request_body = {"instruments": [{"symbol": i.symbol, "type": i.type} for i in instruments]}
+    response = client.post("quotes", f"marketdata/{account_id}/quotes", json=request_body)
+    return response_json(response, "quotes").get("quotes", [])
+
+@instrumented
+def get_quotes(instruments: List[Instrument], account_id: str, api_key: str) -> Dict[str, Quote]:
+    """Quotes for any number of instruments keyed by symbol, QUOTES_BATCH_SIZE per request with the requests
+    sent concurrently. A quote whose outcome isn't SUCCESS, or a chunk whose request failed, is left out;
+    only when every chunk fails is the error raised.
+    """
+    # one entry per symbol, in the order given
+    unique = list({i.symbol: i for i in instruments}.values())
+    chunks = [unique[i:i + QUOTES_BATCH_SIZE] for i in range(0, len(unique), QUOTES_BATCH_SIZE)]
+    if not chunks:
+        return {}
+    if len(chunks) == 1:
+        entries = _request_quotes(chunks[0], account_id, api_key)
+    else:
+        futures = [submit_in_context(quote_executor, _request_quotes, chunk, account_id, api_key) for chunk in chunks]
+        entries = []
+        errors = []
+        for future in futures:
+            try:
+                entries.extend(future.result())
+            except (r.RequestException, ApiError) as e:
+                errors.append(e)
+        if len(errors) == len(chunks):
+            raise errors[0]
+        for e in errors:
+            log_event("quote_chunk_failed", f"Quote chunk failed: {e!r}", logging.WARNING)
+
+    quotes = {}
+    for q in entries:
+        outcome = q.get("outcome")
+        if outcome != "SUCCESS":
+            quote_failures_total.inc(outcome or "missing")
+            continue
+        quote = Quote.from_dict(q)
+        quotes[quote.instrument.symbol] = quote
+        if quote.instrument.type != "OPTION":
+            greeks_cache.observe_underlying(quote.instrument.symbol, quote.last)
+    return quotes
+
+
+
+
+@instrumented
+def get_option_chain(instrument: Instrument, account_id: str, api_key: str, expiration_date: str, lazy: bool = False) -> OptionChain:
+    data = get_option_chain_payload(instrument, account_id, api_key, expiration_date)
+    return OptionChain.from_dict(data, lazy=lazy)
+
+@instrumented
+def get_option_chain_payload(instrument: Instrument, account_id: str, api_key: str, expiration_date: str) -> dict:
+    client = get_client(api_key)
 
     request_body = {
         "instrument": {
@@ -364,9 +1585,94 @@ def get_option_chain(instrument: Instrument, account_id: str, api_key: str, expi
         "expirationDate": expiration_date
     }
 
-    response = r.post(url, headers=headers, json=request_body)
-    data = response.json()
-    return OptionChain.from_dict(data)
+    response = client.post("option-chain", f"marketdata/{account_id}/option-chain", json=request_body)
+    return response_json(response, "option-chain")
+
+
+# -----------------------------
+# Option chain cache
+# -----------------------------
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    refreshes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ChainCache:
+    """Option chains keyed by (symbol, expirationDate) with a TTL and LRU eviction.
+
+    An expired chain is not thrown away: the next fetch tries OptionChain.refresh_quotes
+    first, so if the listed strikes haven't changed the existing chain object and its
+    strike index are kept and only the quotes are swapped.
+    """
+    def __init__(self, ttl_seconds: float = 5.0, max_entries: int = 16, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str, expiration_date: str) -> Optional[OptionChain]:
+        """Fresh cached chain or None, counts as a hit / miss."""
+        key = (symbol, expiration_date)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[0]
+            self.stats.misses += 1
+            return None
+
+    def put(self, symbol: str, expiration_date: str, chain: OptionChain) -> None:
+        key = (symbol, expiration_date)
+        with self._lock:
+            self._entries[key] = (chain, self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def get_chain(self, instrument: Instrument, account_id: str, api_key: str, expiration_date: str, lazy: bool = False) -> OptionChain:
+        chain = self.get(instrument.symbol, expiration_date)
+        if chain is not None:
+            return chain
+        return self.refresh(instrument, account_id, api_key, expiration_date, lazy)
+
+    def refresh(self, instrument: Instrument, account_id: str, api_key: str, expiration_date: str, lazy: bool = False) -> OptionChain:
+        """Fetch the chain even if the cached one is still fresh, reusing the cached object when its strikes match."""
+        data = get_option_chain_payload(instrument, account_id, api_key, expiration_date)
+        with self._lock:
+            stale = self._entries.get((instrument.symbol, expiration_date))
+        if stale is not None and stale[0].refresh_quotes(data):
+            chain = stale[0]
+            with self._lock:
+                self.stats.refreshes += 1
+        else:
+            chain = OptionChain.from_dict(data, lazy=lazy)
+        self.put(instrument.symbol, expiration_date, chain)
+        return chain
+
+    def invalidate(self, symbol: Optional[str] = None, expiration_date: Optional[str] = None) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                if (symbol is None or key[0] == symbol) and (expiration_date is None or key[1] == expiration_date):
+                    del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+chain_cache = ChainCache()
 
 
 
@@ -391,128 +1697,206 @@ def parse_option_symbol(symbol: str):
         "strike": int(strike) / 1000  # optional: convert to real strike
     }
 
-def get_greeks(symbol: str, account_id: str, api_key: str) -> Greeks:
-    url = f"https://api.public.com/userapigateway/option-details/{account_id}/greeks"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+def option_strike(symbol: str) -> float:
+    # OSI symbols always end in the 8 digit strike x 1000
+    return int(symbol[-8:]) / 1000
 
-    params = {"osiSymbols": symbol}
+# -----------------------------
+# Greeks cache
+# -----------------------------
 
-    response = r.get(url, headers=headers, params=params)
+class GreeksCache:
+    """Greeks keyed by OSI symbol. An entry expires after ttl_seconds, or sooner once the
+    underlying's last price (fed in from get_quote) has moved more than max_underlying_move
+    dollars away from where it was when the greeks were fetched.
+    """
+    def __init__(self, ttl_seconds: float = 10.0, max_underlying_move: float = 0.50, max_entries: int = 512, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_underlying_move = max_underlying_move
+        self.max_entries = max_entries
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._underlying_last: Dict[str, float] = {}
+        self._lock = threading.Lock()
 
-    # Debug output
-    if response.status_code != 200:
-        print("STATUS:", response.status_code)
-        print("URL:", response.url)
-        print("RAW:", response.text)
+    @staticmethod
+    def _underlying(symbol: str) -> str:
+        # OSI suffix is yymmdd + C/P + 8 digit strike
+        return symbol[:-15]
+
+    def observe_underlying(self, underlying: str, last_price: float) -> None:
+        with self._lock:
+            self._underlying_last[underlying] = last_price
+
+    def _is_fresh(self, symbol: str, fetched_at: float, underlying_price: Optional[float]) -> bool:
+        if self.clock() - fetched_at > self.ttl_seconds:
+            return False
+        current = self._underlying_last.get(self._underlying(symbol))
+        if underlying_price is None or current is None:
+            return True
+        return abs(current - underlying_price) <= self.max_underlying_move
+
+    def get(self, symbol: str) -> Optional[Greeks]:
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                if self._is_fresh(symbol, entry[1], entry[2]):
+                    self._entries.move_to_end(symbol)
+                    self.stats.hits += 1
+                    return entry[0]
+                del self._entries[symbol]
+                self.stats.evictions += 1
+            self.stats.misses += 1
+            return None
+
+    def get_many(self, symbols: List[str]):
+        """Returns (cached greeks by symbol, symbols that still need fetching)."""
+        found = {}
+        missing = []
+        for symbol in symbols:
+            greeks = self.get(symbol)
+            if greeks is None:
+                missing.append(symbol)
+            else:
+                found[symbol] = greeks
+        return found, missing
 
-    # Try to parse JSON
-    try:
-        data = response.json()
-    except ValueError:
-        raise RuntimeError(f"API did not return JSON. Status={response.status_code}, Body={response.text}")
+    def put(self, greeks: Greeks) -> None:
+        with self._lock:
+            underlying_price = self._underlying_last.get(self._underlying(greeks.symbol))
+            self._entries[greeks.symbol] = (greeks, self.clock(), underlying_price)
+            self._entries.move_to_end(greeks.symbol)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
 
-    return Greeks.from_dict(data)
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
 
+    def __len__(self) -> int:
+        return len(self._entries)
 
 
-def get_short_strike(option_chain: OptionChain, option_type: str, starting_index: int, expected_move: int):
-    keep_searching = True
-    scaling_factor = 1
-    option_chains = option_chain.calls
-    if option_type == "PUT":
-        # print("Fetching Short PUT strike")
-        scaling_factor = -1
-        option_chains = option_chain.puts
+greeks_cache = GreeksCache()
 
-    i = starting_index + (scaling_factor * expected_move)
-    max_search = 5
+def _request_greeks(symbols: List[str], account_id: str, api_key: str) -> dict:
+    client = get_client(api_key)
+
+    # a list is sent as repeated osiSymbols=... params
+    params = {"osiSymbols": symbols}
+
+    response = client.get("greeks", f"option-details/{account_id}/greeks", params=params)
+    return response_json(response, "greeks")
+
+@instrumented
+def get_greeks(symbol: str, account_id: str, api_key: str) -> Greeks:
+    greeks = greeks_cache.get(symbol)
+    if greeks is not None:
+        return greeks
+    data = _request_greeks([symbol], account_id, api_key)
+    if not data.get("greeks"):
+        raise ApiError("greeks", f"no greeks returned for {symbol}")
+    greeks = Greeks.from_dict(data)
+    greeks_cache.put(greeks)
+    return greeks
+
+@instrumented
+def get_greeks_batch(symbols: List[str], account_id: str, api_key: str) -> Dict[str, Greeks]:
+    """Fetch greeks for many OSI symbols in one request, keyed by symbol. Cached symbols are not re-requested."""
+    greeks_by_symbol, missing = greeks_cache.get_many(symbols)
+    if not missing:
+        return greeks_by_symbol
+    data = _request_greeks(missing, account_id, api_key)
+    for entry in data.get("greeks", []):
+        greeks = Greeks.from_entry(entry)
+        greeks_cache.put(greeks)
+        greeks_by_symbol[greeks.symbol] = greeks
+    return greeks_by_symbol
+
+
+
+# short strikes are sold with |delta| in (SHORT_DELTA_MIN, SHORT_DELTA_MAX]
+SHORT_DELTA_MIN = .05
+SHORT_DELTA_MAX = .125
+
+def _walk_delta_band(option_chains, i: int, scaling_factor: int, lookup, max_search: int = 5):
+    """Step from index i until the delta lands in the short strike band, returns (index, greeks)."""
+    keep_searching = True
     while keep_searching:
-        option_strike = option_chains[i]
-        strike = parse_option_symbol(option_strike.instrument.symbol)['strike']
-        # print(f"Fetching greeks for {option_type} at strike {strike}")
-        greeks = get_greeks(option_strike.instrument.symbol, ACCOUNT_ID, API_KEY)        
-        if abs(greeks.delta) > .125 and max_search >= 0:
-            # print(f"{option_type} {strike}: delta too large at {abs(greeks.delta)}")            
+        greeks = lookup(option_chains[i].instrument.symbol)
+        if abs(greeks.delta) > SHORT_DELTA_MAX and max_search >= 0:
             keep_searching = True
             i += (1*scaling_factor)
             max_search -= 1
-        elif abs(greeks.delta) <= .05 and max_search >= 0:
-            # print(f"{option_type} {strike}: delta too small at {abs(greeks.delta)}") 
+        elif abs(greeks.delta) <= SHORT_DELTA_MIN and max_search >= 0:
             keep_searching = True
             i -= (1*scaling_factor)
             max_search -= 1
         else:
             keep_searching = False
-            
-    print(f"Found Short {option_type} at {greeks.strike} at delta {greeks.delta} ({greeks.symbol})")
-    greeks.index = i
-    return greeks
+    return i, greeks
 
+def in_short_delta_band(delta: float) -> bool:
+    return SHORT_DELTA_MIN < abs(delta) <= SHORT_DELTA_MAX
 
+def get_short_strike(option_chain: OptionChain, option_type: str, starting_index: int, expected_move: int, local_greeks: Optional["LocalGreeks"] = None,
+                     account_id: str = ACCOUNT_ID, api_key: str = API_KEY):
+    scaling_factor = 1
+    option_chains = option_chain.calls
+    if option_type == "PUT":
+        # print("Fetching Short PUT strike")
+        scaling_factor = -1
+        option_chains = option_chain.puts
 
-def get_atm_strike_index(option_type: str, last_price: float, ticker_option_chain: OptionChain, starting_index: int) -> int:
-    keep_searching = True
-    return_index = starting_index
-    max_search_count = 5
-    abs_diff = 1
-    strike_price = None
-
-    if option_type == "CALL":
-        # print("Fetching ATM CALL strike")
-        while keep_searching:
-            strike_price = float(parse_option_symbol(ticker_option_chain.calls[return_index].instrument.symbol)['strike'])
-            abs_diff = 1
-            if 0.00 <= strike_price - last_price <= 0.99:
-                keep_searching = False
-            elif strike_price - last_price > 1.00:
-                #print(f"{option_type} {strike_price} is too far above {last_price}")
-                if strike_price - last_price > 3.00:
-                    abs_diff = round(abs(strike_price - last_price)) - 1
-                return_index -= (1 * abs_diff)
-            else:
-                #print(f"{option_type} {strike_price} is too far bellow {last_price}")                
-                if last_price - strike_price > 3.0:
-                    abs_diff = round(abs(last_price - strike_price)) - 1
-                return_index += (1 * abs_diff)
-
-            max_search_count -= 1
-            if max_search_count < 0:
-                keep_searching = False
-    else:
-        # print("Fetching ATM PUT strike")
-        while keep_searching:
-            strike_price = float(parse_option_symbol(ticker_option_chain.puts[return_index].instrument.symbol)['strike'])
-            abs_diff = 1
-            if 0.00 <= (last_price - strike_price) <= 0.999:
-                keep_searching = False
-            elif last_price - strike_price > 1.00:
-                # print(f"{option_type} {strike_price} is too far bellow {last_price}")
-                if last_price - strike_price > 3.00:
-                    abs_diff = round(abs(last_price - strike_price)) - 1
-                return_index += (1 * abs_diff)
-            else:
-                # print(f"{option_type} {strike_price} is too far above {last_price}")
-                if strike_price - last_price > 3.00:
-                    abs_diff = round(abs(strike_price - last_price)) - 1
-                return_index -= (1 * abs_diff) 
-
-            max_search_count -= 1
-            if max_search_count < 0:
-                keep_searching = False
-  
-    print(f"Found ATM strike of {option_type} at {strike_price}")
+    i = starting_index + (scaling_factor * expected_move)
+    max_search = 5
+
+    if local_greeks is not None:
+        # walk on locally priced deltas, then spend a single request confirming the pick
+        i, local = _walk_delta_band(option_chains, i, scaling_factor, local_greeks.side(option_type).get, max_search)
+        greeks = get_greeks(local.symbol, account_id, api_key)
+        if in_short_delta_band(greeks.delta):
+            log_event("short_strike", f"Found Short {option_type} at {greeks.strike} at delta {greeks.delta} (local {local.delta:.3f}) ({greeks.symbol})",
+                      option_type=option_type, strike=greeks.strike, delta=greeks.delta, local_delta=local.delta, symbol=greeks.symbol)
+            return replace(greeks, index=i)
+        log_event("local_delta_rejected", f"Local delta {local.delta:.3f} for {local.symbol} not confirmed by API delta {greeks.delta}, searching remotely",
+                  option_type=option_type, symbol=local.symbol, local_delta=local.delta, delta=greeks.delta)
+
+    # the walk below moves at most max_search + 1 strikes either way,
+    # so one batch request covers every strike it can land on
+    reach = max_search + 1
+    window = option_chains[max(i - reach, 0):i + reach + 1]
+    greeks_by_symbol = get_greeks_batch([q.instrument.symbol for q in window], account_id, api_key)
+
+    def lookup(symbol: str) -> Greeks:
+        greeks = greeks_by_symbol.get(symbol)
+        if greeks is None:
+            # strike missing from the batch response, look it up on its own
+            greeks = get_greeks(symbol, account_id, api_key)
+            greeks_by_symbol[greeks.symbol] = greeks
+        return greeks
+
+    i, greeks = _walk_delta_band(option_chains, i, scaling_factor, lookup, max_search)
+    log_event("short_strike", f"Found Short {option_type} at {greeks.strike} at delta {greeks.delta} ({greeks.symbol})",
+              option_type=option_type, strike=greeks.strike, delta=greeks.delta, symbol=greeks.symbol)
+    # cached greeks are shared, so tag a copy with the chain index
+    return replace(greeks, index=i)
+
+
+
+def get_atm_strike_index(option_type: str, last_price: float, ticker_option_chain: OptionChain) -> int:
+    return_index = ticker_option_chain.atm_index(last_price, option_type)
+    strike_price = ticker_option_chain.strike_at(return_index, option_type)
+    log_event("atm_strike", f"Found ATM strike of {option_type} at {strike_price}", option_type=option_type, strike=strike_price)
     return return_index
 
+@instrumented
 def run_trade_pre_flight(account_id: str, api_key: str,  short_symbol: str, long_symbol: str, quantity: int, limit_price: float, option_type: str):
-    print(f"Running pre-flight on short {short_symbol} and long {long_symbol} {option_type}'s")
-    url = f"https://api.public.com/userapigateway/trading/{account_id}/preflight/multi-leg"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    log_event("preflight", f"Running pre-flight on short {short_symbol} and long {long_symbol} {option_type}'s",
+              option_type=option_type, short_symbol=short_symbol, long_symbol=long_symbol)
+    client = get_client(api_key)
 
     request_body = {
             "orderType": "LIMIT",
@@ -543,30 +1927,17 @@ def run_trade_pre_flight(account_id: str, api_key: str,  short_symbol: str, long
             ]
     }
 
-    response = r.post(url, headers=headers, json=request_body)
-
-    # Debug output
-    if response.status_code != 200:
-        print("STATUS:", response.status_code)
-        print("URL:", response.url)
-        print("RAW:", response.text)
-
-    # Try to parse JSON
-    try:
-        data = response.json()
-    except ValueError:
-        raise RuntimeError(f"API did not return JSON. Status={response.status_code}, Body={response.text}")
-
-    print(data)
+    response = client.post("preflight", f"trading/{account_id}/preflight/multi-leg", json=request_body)
+    # a failed preflight raises, so the spread is never submitted after it
+    data = response_json(response, "preflight")
+    # the whole body only at DEBUG, it is serialized on the writer thread
+    log_event("preflight_response", level=logging.DEBUG, option_type=option_type, body=data)
 
+@instrumented
 def execute_multi_leg_trade(account_id: str, api_key: str, short_symbol: str, long_symbol: str, quantity: int, limit_price: float) -> str:
-    url = f"https://api.public.com/userapigateway/trading/{account_id}/order/multileg"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    print(f"Shorting {short_symbol}")
-    print(f"Buying {long_symbol}")
+    client = get_client(api_key)
+    log_event("submit", f"Shorting {short_symbol}, buying {long_symbol}", short_symbol=short_symbol, long_symbol=long_symbol,
+              limit_price=limit_price)
 
     request_body = {
         "orderId": str(uuid.uuid4()),
@@ -598,132 +1969,1833 @@ def execute_multi_leg_trade(account_id: str, api_key: str, short_symbol: str, lo
         ]
     }
 
-    response = r.post(url, headers=headers, json=request_body)
-    data = response.json()
-    print(data)
+    response = client.post("order", f"trading/{account_id}/order/multileg", json=request_body)
+    data = response_json(response, "order")
+    log_event("order_response", level=logging.DEBUG, short_symbol=short_symbol, body=data)
     return data
 
-def get_account_portfolio(account_id: str, api_key: str) -> Portfolio:
-    url = f"https://api.public.com/userapigateway/trading/{account_id}/portfolio/v2"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
+def _option_leg(symbol: str, side: str) -> dict:
+    return {
+        "instrument": {
+            "symbol": symbol,
+            "type": "OPTION"
+        },
+        "side": side,
+        "openCloseIndicator": "OPEN",
+        "ratioQuantity": 1
     }
 
-    response = r.get(url, headers=headers)
-    data = response.json()
-    return Portfolio.from_dict(data)
+def iron_condor_legs(iron_condor: IronCondor) -> List[dict]:
+    call_spread = iron_condor.call_credit_spread
+    put_spread = iron_condor.put_credit_spread
+    return [
+        _option_leg(call_spread.long_symbol, "BUY"),
+        _option_leg(call_spread.short_symbol, "SELL"),
+        _option_leg(put_spread.long_symbol, "BUY"),
+        _option_leg(put_spread.short_symbol, "SELL"),
+    ]
+
+def iron_condor_limit(iron_condor: IronCondor) -> str:
+    # both wings' limits summed in cents, so e.g. -0.20 + -0.15 goes out as exactly "-0.35"
+    return format_cents(to_cents(iron_condor.call_credit_spread.limit_price) + to_cents(iron_condor.put_credit_spread.limit_price))
+
+@instrumented
+def run_iron_condor_pre_flight(account_id: str, api_key: str, iron_condor: IronCondor) -> r.Response:
+    """Preflight all four legs as one multi-leg order. Returns the response, a 4xx means the API won't take it as one order."""
+    client = get_client(api_key)
 
+    request_body = {
+        "orderType": "LIMIT",
+        "expiration": {
+            "timeInForce": "DAY"
+        },
+        "quantity": str(iron_condor.call_credit_spread.quantity),
+        "limitPrice": iron_condor_limit(iron_condor),
+        "legs": iron_condor_legs(iron_condor)
+    }
 
-def get_iron_condor(ticker: Instrument, account_id: str, api_key: str, today: str, ticker_quote) -> IronCondor:
-    
-    ticker_option_chain = get_option_chain(ticker, account_id, api_key, today)
+    response = client.post("preflight", f"trading/{account_id}/preflight/multi-leg", json=request_body)
+    if response.status_code != 200:
+        log_event("condor_preflight_failed", f"Four-leg preflight returned {response.status_code}", logging.WARNING,
+                  status=response.status_code, body=response.text)
+    return response
+
+@instrumented
+def execute_iron_condor_trade(account_id: str, api_key: str, iron_condor: IronCondor) -> r.Response:
+    """Submit all four legs as one order, so both wings fill (or don't) together."""
+    client = get_client(api_key)
+    call_spread = iron_condor.call_credit_spread
+    put_spread = iron_condor.put_credit_spread
+    log_event("submit", f"Shorting {call_spread.short_symbol} and {put_spread.short_symbol}, buying {call_spread.long_symbol} and {put_spread.long_symbol}",
+              short_symbols=[call_spread.short_symbol, put_spread.short_symbol], long_symbols=[call_spread.long_symbol, put_spread.long_symbol],
+              limit_price=iron_condor_limit(iron_condor))
+
+    request_body = {
+        "orderId": str(uuid.uuid4()),
+        "quantity": call_spread.quantity,
+        "type": "LIMIT",
+        "limitPrice": iron_condor_limit(iron_condor),
+        "expiration": {
+            "timeInForce": "DAY"
+        },
+        "legs": iron_condor_legs(iron_condor)
+    }
+
+    response = client.post("order", f"trading/{account_id}/order/multileg", json=request_body)
+    log_event("order_response", level=logging.DEBUG, status=response.status_code, body=response.text)
+    return response
+
+@instrumented
+def get_account_portfolio(account_id: str, api_key: str) -> Portfolio:
+    return Portfolio.from_dict(get_account_portfolio_payload(account_id, api_key))
+
+@instrumented
+def get_account_portfolio_payload(account_id: str, api_key: str) -> dict:
+    client = get_client(api_key)
+
+    response = client.get("portfolio", f"trading/{account_id}/portfolio/v2")
+    return response_json(response, "portfolio")
+
+# -----------------------------
+# Indexed portfolio
+# -----------------------------
+
+OPTION_SUFFIX = "-OPTION"
+# spread loss, as a % of the credit received, that counts as at risk / gets the spread closed
+AT_RISK_LOSS_PCT = -85.0
+CLOSE_LOSS_PCT = -100.0
+
+def osi_symbol(symbol: str) -> str:
+    """Portfolio option symbols carry a -OPTION suffix the market data endpoints don't use."""
+    return symbol[:-len(OPTION_SUFFIX)] if symbol.endswith(OPTION_SUFFIX) else symbol
+
+
+@dataclass(slots=True)
+class HeldOption:
+    # OSI symbol, without the portfolio suffix
+    symbol: str
+    underlying: str
+    expiration: str
+    # "C" or "P"
+    type: str
+    strike: float
+    position: CompactPosition
+
+    @property
+    def group(self) -> tuple:
+        # legs that can be paired into a spread share this
+        return (self.underlying, self.expiration, self.type)
+
+
+@dataclass
+class SpreadPosition:
+    spread: CreditSpread
+    short: HeldOption
+    long: HeldOption
+
+    @property
+    def key(self) -> tuple:
+        return (self.short.symbol, self.long.symbol)
+
+    @property
+    def cost(self) -> int:
+        """Cents paid to open, negative for the credit received."""
+        return (self.short.position.total_cost or 0) + (self.long.position.total_cost or 0)
+
+    @property
+    def value(self) -> int:
+        """Cents to buy it back now, negative while it is a liability."""
+        return (self.short.position.current_value or 0) + (self.long.position.current_value or 0)
+
+    @property
+    def pnl(self) -> int:
+        return self.value - self.cost
+
+    @property
+    def pnl_pct(self) -> float:
+        """P&L as a % of the credit (or debit), -100 means the whole credit has been lost."""
+        return self.pnl / abs(self.cost) * 100 if self.cost else 0.0
+
+
+@dataclass
+class PortfolioDiff:
+    added: set = field(default_factory=set)
+    removed: set = field(default_factory=set)
+    changed: set = field(default_factory=set)
+
+    @property
+    def touched(self) -> set:
+        return self.added | self.removed | self.changed
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+class PortfolioStore:
+    """Positions kept across cycles, indexed by symbol, underlying, expiration and call/put.
+
+    apply() takes each new portfolio response and only touches what differs from the last one:
+    legs in a call/put group that gained, lost or changed a position are re-paired into
+    SpreadPositions and only those spreads are re-scored, everything else keeps its last result.
+    """
+    def __init__(self):
+        self.account_id: Optional[str] = None
+        # cents
+        self.buying_power: Optional[int] = None
+        self.options_buying_power: Optional[int] = None
+        self.stocks: Dict[str, CompactPosition] = {}
+        self.options: Dict[str, HeldOption] = {}
+        self.by_underlying: Dict[str, set] = {}
+        self.by_expiration: Dict[str, set] = {}
+        self.by_type: Dict[str, set] = {"C": set(), "P": set()}
+        self.spreads: Dict[tuple, SpreadPosition] = {}
+        self.spread_by_leg: Dict[str, SpreadPosition] = {}
+        # spreads we opened, so pairing prefers the legs we actually traded together
+        self.spreads_sold: List[CreditSpread] = []
+        # loss % per spread key, or per symbol for a leg that isn't part of a spread
+        self.risk: Dict[object, float] = {}
+        self.closing: set = set()
+        # symbol -> (raw entry, decoded position) from the last response, for skipping entries that didn't change
+        self._entries: Dict[str, tuple] = {}
+        # apply() runs on the cycle thread while an AtRiskWatcher reads and re-scores from its own
+        self.lock = threading.RLock()
+
+    # --- indexes ---
+
+    def options_for(self, underlying: Optional[str] = None, expiration: Optional[str] = None,
+                    option_type: Optional[str] = None) -> List[HeldOption]:
+        selected = None
+        for index, key in ((self.by_underlying, underlying), (self.by_expiration, expiration), (self.by_type, option_type)):
+            if key is None:
+                continue
+            symbols = index.get(key, set())
+            selected = symbols if selected is None else selected & symbols
+        if selected is None:
+            return list(self.options.values())
+        return [self.options[symbol] for symbol in selected]
+
+    def _index(self, held: HeldOption) -> None:
+        self.options[held.symbol] = held
+        self.by_underlying.setdefault(held.underlying, set()).add(held.symbol)
+        self.by_expiration.setdefault(held.expiration, set()).add(held.symbol)
+        self.by_type[held.type].add(held.symbol)
+
+    def _unindex(self, symbol: str) -> HeldOption:
+        held = self.options.pop(symbol)
+        self.by_underlying[held.underlying].discard(symbol)
+        self.by_expiration[held.expiration].discard(symbol)
+        self.by_type[held.type].discard(symbol)
+        return held
+
+    # --- updates ---
+
+    def apply(self, payload: dict) -> PortfolioDiff:
+        """Merge a portfolio/v2 response, returns which option symbols were added, removed or changed.
+        A position whose raw entry equals the last response's keeps its decoded position, it's neither
+        decoded nor compared field by field again.
+        """
+        entries = {}
+        for entry in payload.get("positions") or ():
+            symbol = entry["instrument"]["symbol"]
+            last = self._entries.get(symbol)
+            entries[symbol] = last if last is not None and last[0] == entry else (entry, decode(CompactPosition, entry))
+        portfolio = decode(CompactPortfolio, {**payload, "positions": ()})
+        portfolio.positions = tuple(position for _, position in entries.values())
+        with self.lock:
+            self._entries = entries
+            return self._apply(portfolio)
+
+    def _apply(self, portfolio: CompactPortfolio) -> PortfolioDiff:
+        self.account_id = portfolio.account_id
+        self.buying_power = portfolio.buying_power
+        self.options_buying_power = portfolio.options_buying_power
+
+        diff = PortfolioDiff()
+        touched_groups = set()
+        # only the price moved, the pairing still holds and just the spread (or loose leg) is re-scored
+        rescore = set()
+        seen = set()
+        stocks = {}
+        for position in portfolio.positions:
+            if position.type != "OPTION":
+                stocks[position.symbol] = position
+                continue
+            symbol = osi_symbol(position.symbol)
+            seen.add(symbol)
+            held = self.options.get(symbol)
+            if held is None:
+                parsed = parse_option_symbol(symbol)
+                held = HeldOption(symbol, parsed["underlying"], parsed["expiration"], parsed["type"], parsed["strike"], position)
+                self._index(held)
+                diff.added.add(symbol)
+            elif held.position is not position and held.position != position:
+                repriced_only = held.position.quantity == position.quantity
+                held.position = position
+                diff.changed.add(symbol)
+                if repriced_only:
+                    rescore.add(symbol)
+                    continue
+            else:
+                continue
+            touched_groups.add(held.group)
+        self.stocks = stocks
+
+        for symbol in set(self.options) - seen:
+            touched_groups.add(self._unindex(symbol).group)
+            diff.removed.add(symbol)
+            self.risk.pop(symbol, None)
+            self.closing = {key for key in self.closing if key != symbol and not (isinstance(key, tuple) and symbol in key)}
+
+        for group in touched_groups:
+            self._pair(group)
+        for symbol in rescore:
+            held = self.options[symbol]
+            if held.group in touched_groups:
+                continue
+            spread = self.spread_by_leg.get(symbol)
+            if spread is not None:
+                self._score(spread.key, spread.pnl_pct)
+            elif held.position.quantity < 0:
+                self._score_short(held)
+        return diff
+
+    def _pair(self, group: tuple) -> None:
+        """Re-pair one (underlying, expiration, call/put) group and re-score its spreads and loose legs."""
+        underlying, expiration, option_type = group
+        legs = self.options_for(underlying, expiration, option_type)
+        for key in [key for key, spread in self.spreads.items() if spread.short.group == group]:
+            spread = self.spreads.pop(key)
+            self.spread_by_leg.pop(spread.short.symbol, None)
+            self.spread_by_leg.pop(spread.long.symbol, None)
+            self.risk.pop(key, None)
+
+        shorts = {held.symbol: held for held in legs if (held.position.quantity or 0) < 0}
+        longs = {held.symbol: held for held in legs if (held.position.quantity or 0) > 0}
+
+        # legs we sold together first, then each short with the nearest long further out of the money
+        for sold in self.spreads_sold:
+            if sold.short_symbol in shorts and sold.long_symbol in longs:
+                self._add_spread(shorts.pop(sold.short_symbol), longs.pop(sold.long_symbol), sold.limit_price)
+        calls = option_type == "C"
+        by_strike = sorted(longs.values(), key=lambda h: h.strike)
+        long_strikes = [h.strike for h in by_strike]
+        for short in sorted(shorts.values(), key=lambda h: h.strike, reverse=not calls):
+            i = bisect_right(long_strikes, short.strike) if calls else bisect_left(long_strikes, short.strike) - 1
+            if not 0 <= i < len(by_strike):
+                self._score_short(short)
+                continue
+            long = by_strike.pop(i)
+            long_strikes.pop(i)
+            self._add_spread(short, long, None)
+        for long in by_strike:
+            # a long on its own can lose at most what was paid, never at risk the way a short is
+            self.risk.pop(long.symbol, None)
+
+    def _add_spread(self, short: HeldOption, long: HeldOption, limit_price: Optional[float]) -> None:
+        quantity = int(min(abs(short.position.quantity), long.position.quantity))
+        spread = SpreadPosition(CreditSpread(short.symbol, long.symbol, quantity, limit_price), short, long)
+        self.spreads[spread.key] = spread
+        self.spread_by_leg[short.symbol] = spread
+        self.spread_by_leg[long.symbol] = spread
+        self.risk.pop(short.symbol, None)
+        self._score(spread.key, spread.pnl_pct)
+
+    def _score_short(self, short: HeldOption) -> None:
+        # from cost basis like spreads (and the watcher's re-scores), so the two never disagree about a leg
+        cost = short.position.total_cost or 0
+        value = short.position.current_value or 0
+        self._score(short.symbol, (value - cost) / abs(cost) * 100 if cost else 0.0)
+
+    def _score(self, key, loss_pct: float) -> None:
+        if loss_pct <= AT_RISK_LOSS_PCT:
+            self.risk[key] = loss_pct
+        else:
+            self.risk.pop(key, None)
+            self.closing.discard(key)
+
+    def record_sold(self, spread: CreditSpread) -> None:
+        with self.lock:
+            self.spreads_sold.append(spread)
+
+    def at_risk_legs(self) -> Dict[object, List[HeldOption]]:
+        """Legs behind every at-risk score, keyed like risk."""
+        with self.lock:
+            legs = {}
+            for key in self.risk:
+                if isinstance(key, tuple):
+                    spread = self.spreads[key]
+                    legs[key] = [spread.short, spread.long]
+                else:
+                    legs[key] = [self.options[key]]
+            return legs
+
+    def rescore(self, key, loss_pct: float) -> None:
+        """Score from a fresher mark than the last portfolio response, e.g. an AtRiskWatcher's."""
+        with self.lock:
+            if key in self.spreads or key in self.options:
+                self._score(key, loss_pct)
+
+    # --- risk ---
+
+    def evaluate_option_positions(self, options_position_summary: OptionsPositionSummary) -> List[object]:
+        """Update the summary from the current scores and return the spread keys (or lone short symbols)
+        that just crossed CLOSE_LOSS_PCT. Costs nothing beyond what apply() already re-scored.
+        """
+        with self.lock:
+            options_position_summary.positions_at_risk = len(self.risk)
+            to_close = [key for key, loss_pct in self.risk.items() if loss_pct <= CLOSE_LOSS_PCT and key not in self.closing]
+            for key in to_close:
+                self.closing.add(key)
+                short_symbol = key[0] if isinstance(key, tuple) else key
+                self.close_spread(key)
+                if self.options[short_symbol].type == "C":
+                    options_position_summary.call_spreads_closed += 1
+                else:
+                    options_position_summary.put_spreads_closed += 1
+            return to_close
+
+    def close_spread(self, key) -> None:
+        log_event("close_position", f"Closing Position {key}", spread=str(key))
+
+
+
+# -----------------------------
+# Local greeks (Black-Scholes)
+# -----------------------------
+
+RISK_FREE_RATE = 0.04
+eastern = pytz.timezone("US/Eastern")
+MARKET_CLOSE = dt_time(16, 0)  # Eastern
+# floor so 0DTE contracts priced in the last minutes don't divide by ~0
+MIN_YEARS_TO_EXPIRY = 1 / (365 * 24 * 60)
+# used when no strike on the chain has a solvable implied vol
+DEFAULT_IMPLIED_VOLATILITY = 0.20
+
+def years_to_expiry(expiration: str, now: datetime) -> float:
+    """expiration is the OSI yymmdd, options stop trading at the 4pm Eastern close."""
+    expiry_date = datetime.strptime(expiration, "%y%m%d").date()
+    close = eastern.localize(datetime.combine(expiry_date, MARKET_CLOSE))
+    if now.tzinfo is None:
+        now = pytz.utc.localize(now)
+    seconds = (close - now).total_seconds()
+    return max(seconds / (365 * 24 * 3600), MIN_YEARS_TO_EXPIRY)
+
+def _norm_cdf(x: np.ndarray) -> np.ndarray:
+    # Abramowitz & Stegun 7.1.26 erf, |error| < 1.5e-7, keeps us off scipy
+    z = np.abs(x) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+def _norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / np.sqrt(2.0 * np.pi)
+
+def _d1_d2(spot, strike, t, rate, sigma):
+    sqrt_t = np.sqrt(t)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * sigma * sigma) * t) / (sigma * sqrt_t)
+    return d1, d1 - sigma * sqrt_t
+
+def black_scholes_price(is_call: np.ndarray, spot: float, strike: np.ndarray, t: float, rate: float, sigma: np.ndarray) -> np.ndarray:
+    d1, d2 = _d1_d2(spot, strike, t, rate, sigma)
+    discount = np.exp(-rate * t)
+    call = spot * _norm_cdf(d1) - strike * discount * _norm_cdf(d2)
+    put = strike * discount * _norm_cdf(-d2) - spot * _norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+def implied_volatility(is_call: np.ndarray, price: np.ndarray, spot: float, strike: np.ndarray, t: float, rate: float,
+                       low: float = 1e-4, high: float = 5.0, iterations: int = 60) -> np.ndarray:
+    """Vectorized bisection on sigma, NaN where the price is outside what any vol in [low, high] can produce."""
+    lo = np.full(strike.shape, low)
+    hi = np.full(strike.shape, high)
+    solvable = (
+        (price > 0)
+        & (price >= black_scholes_price(is_call, spot, strike, t, rate, lo))
+        & (price <= black_scholes_price(is_call, spot, strike, t, rate, hi))
+    )
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        too_high = black_scholes_price(is_call, spot, strike, t, rate, mid) > price
+        hi = np.where(too_high, mid, hi)
+        lo = np.where(too_high, lo, mid)
+    return np.where(solvable, (lo + hi) / 2, np.nan)
+
+def _fill_smile(strike: np.ndarray, iv: np.ndarray) -> np.ndarray:
+    # strikes with no usable mid borrow the vol of their neighbours, flat past the ends
+    valid = ~np.isnan(iv)
+    if not valid.any():
+        return np.full(strike.shape, DEFAULT_IMPLIED_VOLATILITY)
+    return np.interp(strike, strike[valid], iv[valid])
+
+
+class SideGreeks:
+    """Locally priced greeks for one side of a chain, one array entry per strike."""
+    def __init__(self, symbols: List[str], strike: np.ndarray, mid: np.ndarray, implied_volatility: np.ndarray,
+                 delta: np.ndarray, gamma: np.ndarray, theta: np.ndarray, vega: np.ndarray, rho: np.ndarray):
+        self.symbols = symbols
+        self.strike = strike
+        self.mid = mid
+        self.implied_volatility = implied_volatility
+        self.delta = delta
+        self.gamma = gamma
+        self.theta = theta
+        self.vega = vega
+        self.rho = rho
+        self._index = {symbol: i for i, symbol in enumerate(symbols)}
+
+    def greeks_at(self, i: int) -> Greeks:
+        return Greeks(
+            symbol=self.symbols[i],
+            delta=float(self.delta[i]),
+            gamma=float(self.gamma[i]),
+            theta=float(self.theta[i]),
+            vega=float(self.vega[i]),
+            rho=float(self.rho[i]),
+            impliedVolatility=float(self.implied_volatility[i]),
+            strike=float(self.strike[i]),
+            index=i,
+        )
+
+    def get(self, symbol: str) -> Optional[Greeks]:
+        i = self._index.get(symbol)
+        return None if i is None else self.greeks_at(i)
+
+
+@dataclass
+class LocalGreeks:
+    spot: float
+    years_to_expiry: float
+    rate: float
+    calls: SideGreeks
+    puts: SideGreeks
+
+    def side(self, option_type: str = "CALL") -> SideGreeks:
+        return self.puts if option_type == "PUT" else self.calls
+
+
+def compute_local_greeks(option_chain: OptionChain, underlying_quote: Quote, now: Optional[datetime] = None, rate: float = RISK_FREE_RATE,
+                         columns: Optional[ColumnarOptionChain] = None) -> LocalGreeks:
+    """Solve implied vol from bid/ask mids and price delta/gamma/theta/vega/rho for every strike
+    on both sides of the chain in one vectorized pass. Theta is per calendar day, vega and rho per 1 point.
+    Pass columns when the chain has already been converted.
+    """
+    columns = columns or ColumnarOptionChain.from_chain(option_chain)
+    calls, puts = columns.calls, columns.puts
+    symbols = calls.symbols + puts.symbols
+    expiration = symbols[0][-15:-9]
+    t = years_to_expiry(expiration, now or datetime.now(pytz.utc))
+    spot = underlying_quote.last
+
+    strike = np.concatenate([calls.strike, puts.strike])
+    mid = np.concatenate([calls.mid(), puts.mid()])
+    is_call = np.concatenate([np.ones(len(calls), dtype=bool), np.zeros(len(puts), dtype=bool)])
+
+    # each side gets its own smile fill, calls and puts quote differently away from the money
+    iv = implied_volatility(is_call, mid, spot, strike, t, rate)
+    iv = np.concatenate([_fill_smile(calls.strike, iv[:len(calls)]), _fill_smile(puts.strike, iv[len(calls):])])
+
+    d1, d2 = _d1_d2(spot, strike, t, rate, iv)
+    sqrt_t = np.sqrt(t)
+    discount = np.exp(-rate * t)
+    pdf_d1 = _norm_pdf(d1)
+    delta = np.where(is_call, _norm_cdf(d1), _norm_cdf(d1) - 1.0)
+    gamma = pdf_d1 / (spot * iv * sqrt_t)
+    vega = spot * pdf_d1 * sqrt_t / 100
+    decay = -spot * pdf_d1 * iv / (2 * sqrt_t)
+    theta = np.where(
+        is_call,
+        decay - rate * strike * discount * _norm_cdf(d2),
+        decay + rate * strike * discount * _norm_cdf(-d2),
+    ) / 365
+    rho = np.where(is_call, strike * t * discount * _norm_cdf(d2), -strike * t * discount * _norm_cdf(-d2)) / 100
+
+    n = len(calls)
+    def side(sl: slice, names: List[str]) -> SideGreeks:
+        return SideGreeks(names, strike[sl], mid[sl], iv[sl], delta[sl], gamma[sl], theta[sl], vega[sl], rho[sl])
+
+    return LocalGreeks(
+        spot=spot,
+        years_to_expiry=t,
+        rate=rate,
+        calls=side(slice(0, n), calls.symbols),
+        puts=side(slice(n, None), puts.symbols),
+    )
+
+
+# -----------------------------
+# Candidate spread scanner
+# -----------------------------
+
+# long leg distances (dollars) tried for every short strike, a width whose strike isn't listed is skipped
+SCAN_WIDTHS = (1, 2, 3, 5)
+# contracts both legs need on the side we trade into (short bid, long ask), and open interest on each leg
+SCAN_MIN_SIZE = 1
+SCAN_MIN_OPEN_INTEREST = 0
+# best candidates per side that get paired up into condors
+SCAN_PAIR_DEPTH = 20
+
+
+class SpreadCandidates:
+    """Credit spreads on one side of a chain that passed the scan filters, one array entry per candidate,
+    ranked best credit-to-risk first (more contracts on the thinner leg breaks ties). Prices are per share in dollars.
+    """
+    def __init__(self, option_type: str, symbols: List[str], short_index: np.ndarray, long_index: np.ndarray, short_strike: np.ndarray,
+                 width: np.ndarray, credit: np.ndarray, natural_credit: np.ndarray, short_delta: np.ndarray, liquidity: np.ndarray):
+        self.option_type = option_type
+        self.symbols = symbols
+        self.short_index = short_index
+        self.long_index = long_index
+        self.short_strike = short_strike
+        self.width = width
+        # at the legs' mids, and what hitting the short's bid and lifting the long's ask would get
+        self.credit = credit
+        self.natural_credit = natural_credit
+        self.max_loss = width - credit
+        self.credit_to_risk = credit / self.max_loss
+        self.short_delta = short_delta
+        self.liquidity = liquidity
+
+    def __len__(self) -> int:
+        return len(self.short_index)
+
+    def spread(self, i: int, quantity: int = 1) -> CreditSpread:
+        """Candidate i as an order, limit at its mid credit."""
+        return CreditSpread(
+            short_symbol=self.symbols[self.short_index[i]],
+            long_symbol=self.symbols[self.long_index[i]],
+            quantity=quantity,
+            limit_price=-round(float(self.credit[i]) * 100) / 100,
+        )
+
+    def table(self, top: int = 10) -> List[dict]:
+        return [
+            {
+                "short": self.symbols[self.short_index[i]],
+                "long": self.symbols[self.long_index[i]],
+                "width": float(self.width[i]),
+                "credit": float(self.credit[i]),
+                "natural_credit": float(self.natural_credit[i]),
+                "max_loss": float(self.max_loss[i]),
+                "credit_to_risk": float(self.credit_to_risk[i]),
+                "short_delta": float(self.short_delta[i]),
+                "liquidity": int(self.liquidity[i]),
+            }
+            for i in range(min(top, len(self)))
+        ]
+
+
+def scan_credit_spreads(side: ChainColumns, greeks: SideGreeks, option_type: str, widths=SCAN_WIDTHS, min_credit: float = 0.0,
+                        min_size: int = SCAN_MIN_SIZE, min_open_interest: int = SCAN_MIN_OPEN_INTEREST) -> SpreadCandidates:
+    """Score every (short strike, width) credit spread on one side in one vectorized pass. greeks must come
+    from the same columns (compute_local_greeks(..., columns=...)) so the rows line up.
+    """
+    n = len(side)
+    width = np.asarray(widths, dtype=np.float64)
+    # calls are sold below the long leg, puts above it
+    direction = -1.0 if option_type == "PUT" else 1.0
+
+    # (short strike, width) grid, the long leg has to be a listed strike
+    short_index = np.broadcast_to(np.arange(n)[:, None], (n, len(width)))
+    target = side.strike[:, None] + direction * width[None, :]
+    long_index = np.minimum(np.searchsorted(side.strike, target), max(n - 1, 0))
+    listed = np.abs(side.strike[long_index] - target) < 1e-6
+
+    mid = side.mid()
+    credit = mid[short_index] - mid[long_index]
+    natural_credit = side.bid[short_index] - side.ask[long_index]
+    liquidity = np.minimum(side.bid_size[short_index], side.ask_size[long_index])
+    short_delta = greeks.delta[short_index]
+    abs_delta = np.abs(short_delta)
+    full_width = np.broadcast_to(width[None, :], (n, len(width)))
+    open_interest_ok = side.open_interest_at_least(min_open_interest)
+
+    keep = (
+        listed
+        & (abs_delta > SHORT_DELTA_MIN) & (abs_delta <= SHORT_DELTA_MAX)
+        & (side.bid[short_index] > 0) & (side.ask[long_index] > 0)
+        & (liquidity >= min_size)
+        & open_interest_ok[short_index] & open_interest_ok[long_index]
+        & (credit >= min_credit) & (credit < full_width)
+    )
+
+    credit = credit[keep]
+    full_width = full_width[keep]
+    liquidity = liquidity[keep]
+    # credit_to_risk descending, then liquidity descending
+    order = np.lexsort((-liquidity, -(credit / (full_width - credit))))
+    short_index = short_index[keep][order]
+    return SpreadCandidates(
+        option_type=option_type,
+        symbols=side.symbols,
+        short_index=short_index,
+        long_index=long_index[keep][order],
+        short_strike=side.strike[short_index],
+        width=full_width[order],
+        credit=credit[order],
+        natural_credit=natural_credit[keep][order],
+        short_delta=short_delta[keep][order],
+        liquidity=liquidity[order],
+    )
+
+
+@dataclass
+class CondorScan:
+    calls: SpreadCandidates
+    puts: SpreadCandidates
+    # indices into calls / puts of the best pair, None when either side came up empty
+    call_pick: Optional[int] = None
+    put_pick: Optional[int] = None
+    credit_to_risk: float = 0.0
+    elapsed_ms: float = 0.0
+
+    def iron_condor(self, quantity: int = 1) -> Optional[IronCondor]:
+        if self.call_pick is None or self.put_pick is None:
+            return None
+        return IronCondor(call_credit_spread=self.calls.spread(self.call_pick, quantity),
+                          put_credit_spread=self.puts.spread(self.put_pick, quantity))
+
+
+def scan_iron_condor(option_chain: OptionChain, underlying_quote: Quote, widths=SCAN_WIDTHS, min_credit: float = 0.0,
+                     min_size: int = SCAN_MIN_SIZE, min_open_interest: int = SCAN_MIN_OPEN_INTEREST, pair_depth: int = SCAN_PAIR_DEPTH,
+                     now: Optional[datetime] = None) -> CondorScan:
+    """Rank credit spreads on both sides from the chain's own quotes and locally priced deltas, then pick
+    the call/put pair with the best condor credit-to-risk (only one side can finish in the money, so the
+    risk is the wider width less both credits). No requests are made.
+    """
+    start = time.perf_counter()
+    columns = ColumnarOptionChain.from_chain(option_chain)
+    local = compute_local_greeks(option_chain, underlying_quote, now=now, columns=columns)
+    calls = scan_credit_spreads(columns.calls, local.calls, "CALL", widths, min_credit, min_size, min_open_interest)
+    puts = scan_credit_spreads(columns.puts, local.puts, "PUT", widths, min_credit, min_size, min_open_interest)
+    scan = CondorScan(calls, puts)
+
+    if len(calls) and len(puts):
+        c = slice(0, pair_depth)
+        credit = calls.credit[c][:, None] + puts.credit[c][None, :]
+        risk = np.maximum(calls.width[c][:, None], puts.width[c][None, :]) - credit
+        ratio = np.where(risk > 0, credit / np.where(risk > 0, risk, 1.0), -np.inf)
+        call_pick, put_pick = np.unravel_index(int(np.argmax(ratio)), ratio.shape)
+        scan.call_pick, scan.put_pick = int(call_pick), int(put_pick)
+        scan.credit_to_risk = float(ratio[call_pick, put_pick])
+    scan.elapsed_ms = (time.perf_counter() - start) * 1000
+    return scan
+
+
+# call and put legs are independent, so each stage runs them side by side
+# sized for several strategy instances entering at once (see StrategyRunner), threads are only started on demand
+leg_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="leg")
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, start, time.perf_counter()
+
+def run_legs_concurrently(stage: str, call_fn, put_fn):
+    """Run the call-side and put-side callables together, returns (call_result, put_result, LegTiming)."""
+    call_future = submit_in_context(leg_executor, _timed, call_fn)
+    put_future = submit_in_context(leg_executor, _timed, put_fn)
+    call_result, call_start, call_end = call_future.result()
+    put_result, put_start, put_end = put_future.result()
+    timing = LegTiming(
+        stage=stage,
+        call_ms=(call_end - call_start) * 1000,
+        put_ms=(put_end - put_start) * 1000,
+        skew_ms=abs(call_end - put_end) * 1000,
+    )
+    return call_result, put_result, timing
+
+def spread_mid_credit(spread: CreditSpread, quotes: Dict[str, Quote]) -> Optional[int]:
+    """Mid price of the spread in cents, negative for a credit. None when a leg has no two-sided quote."""
+    mids = []
+    for symbol in (spread.short_symbol, spread.long_symbol):
+        quote = quotes.get(symbol)
+        if quote is None or not quote.bid or not quote.ask:
+            return None
+        mids.append(to_cents(quote.bid) + to_cents(quote.ask))
+    # sold short, bought long, so the mid is the long's less the short's
+    return round((mids[1] - mids[0]) / 2)
+
+def price_spreads_at_mid(spreads: List[CreditSpread], minimum_credit: float, account_id: str, api_key: str) -> None:
+    """Sets each spread's limit to its mid credit from one batched quote of all the legs, or leaves minimum_credit
+    when the mid is worse or can't be worked out.
+    """
+    legs = [Instrument(symbol, "OPTION") for spread in spreads for symbol in (spread.short_symbol, spread.long_symbol)]
+    quotes = get_quotes(legs, account_id, api_key)
+    floor = to_cents(minimum_credit)
+    for spread in spreads:
+        mid = spread_mid_credit(spread, quotes)
+        limit = floor if mid is None else min(mid, floor)
+        spread.limit_price = limit / 100
+        log_event("limit_price", f"{spread.short_symbol}/{spread.long_symbol}: mid {'-' if mid is None else format_cents(mid)}, limit {format_cents(limit)}",
+                  short_symbol=spread.short_symbol, long_symbol=spread.long_symbol, mid_cents=mid, limit_cents=limit)
+
+def get_iron_condor(ticker: Instrument, account_id: str, api_key: str, today: str, ticker_quote, ticker_option_chain: Optional[OptionChain] = None,
+                    params: Optional["StrategyParams"] = None) -> IronCondor:
+    params = params or StrategyParams()
+
+    if ticker_option_chain is None:
+        # only the strikes around ATM get touched, so leave the rest of the chain undecoded
+        ticker_option_chain = chain_cache.get_chain(ticker, account_id, api_key, today, lazy=True)
     
-    # starting roughly in the middle of the options chain
-    atm_call_index = get_atm_strike_index("CALL", ticker_quote.last, ticker_option_chain, 62) #62 #qqq_option_chain.call_strikes_count // 2
-    atm_put_index = get_atm_strike_index("PUT", ticker_quote.last, ticker_option_chain, 61) #qqq_option_chain.put_strikes_count // 2
+    if params.strike_selection == "scan":
+        # minimum_credit is negative for credits, the scan wants it per spread as a positive price
+        scan = scan_iron_condor(ticker_option_chain, ticker_quote, params.scan_widths, min_credit=-params.minimum_credit)
+        iron_condor = scan.iron_condor()
+        if iron_condor is not None:
+            call, put = iron_condor.call_credit_spread, iron_condor.put_credit_spread
+            log_event("scan", f"Scanned {len(scan.calls)} call / {len(scan.puts)} put spreads in {scan.elapsed_ms:.1f} ms, "
+                      f"picked {call.short_symbol}/{call.long_symbol} at {call.limit_price} and {put.short_symbol}/{put.long_symbol} "
+                      f"at {put.limit_price} ({scan.credit_to_risk:.3f} credit to risk)",
+                      call_candidates=len(scan.calls), put_candidates=len(scan.puts), duration_ms=scan.elapsed_ms,
+                      credit_to_risk=scan.credit_to_risk, top_calls=scan.calls.table(3), top_puts=scan.puts.table(3))
+            iron_condor.timings.append(LegTiming("scan", scan.elapsed_ms, scan.elapsed_ms, 0.0))
+            return iron_condor
+        log_event("scan_empty", f"Scan found no spreads ({len(scan.calls)} call, {len(scan.puts)} put), walking strikes instead",
+                  logging.WARNING, duration_ms=scan.elapsed_ms)
+
+    atm_call_index = get_atm_strike_index("CALL", ticker_quote.last, ticker_option_chain)
+    atm_put_index = get_atm_strike_index("PUT", ticker_quote.last, ticker_option_chain)
         
     # sanity check
     # ATM strikes should be no more than $1 away from each other, and current price should be between them
-    atm_call_strike = float(parse_option_symbol(ticker_option_chain.calls[atm_call_index].instrument.symbol)['strike'])
-    atm_put_strike = float(parse_option_symbol(ticker_option_chain.puts[atm_put_index].instrument.symbol)['strike'])
+    atm_call_strike = ticker_option_chain.strike_at(atm_call_index, "CALL")
+    atm_put_strike = ticker_option_chain.strike_at(atm_put_index, "PUT")
     if atm_call_strike - atm_put_strike > 1.0 or ticker_quote.last > atm_call_strike or ticker_quote.last < atm_put_strike:
-        print("ERROR: Call and Puts too far aways")
-
-    # Get short strikes based on delta rules (between .04 and .10)
-    call_greeks = get_short_strike(ticker_option_chain, "CALL", atm_call_index, EXPECTED_MOVE)
-    put_greeks = get_short_strike(ticker_option_chain, "PUT", atm_put_index, EXPECTED_MOVE)
-
-    # we are trading 2 dollar wide spreads so...
-    #short_call_symbol = ticker_option_chain.calls[call_greeks.index].instrument.symbol
-    long_call_symbol = ticker_option_chain.calls[call_greeks.index + 2].instrument.symbol
-    #short_put_symbol = ticker_option_chain.calls[put_greeks.index].instrument.symbol
-    long_put_symbol = ticker_option_chain.puts[put_greeks.index - 2].instrument.symbol
+        log_event("atm_mismatch", "Call and Puts too far aways", logging.ERROR,
+                  call_strike=atm_call_strike, put_strike=atm_put_strike, last=ticker_quote.last)
+
+    local_greeks = None
+    if params.greeks_mode == "local":
+        local_greeks = compute_local_greeks(ticker_option_chain, ticker_quote)
+
+    # Get short strikes based on delta rules (between .04 and .10), both sides searched at once
+    call_greeks, put_greeks, search_timing = run_legs_concurrently(
+        "search",
+        lambda: get_short_strike(ticker_option_chain, "CALL", atm_call_index, params.expected_move, local_greeks, account_id, api_key),
+        lambda: get_short_strike(ticker_option_chain, "PUT", atm_put_index, params.expected_move, local_greeks, account_id, api_key),
+    )
+
+    # we are trading spread_width dollar wide spreads, or the next strike out if that one isn't listed
+    long_call_index = ticker_option_chain.atm_index(call_greeks.strike + params.spread_width, "CALL")
+    long_call_symbol = ticker_option_chain.calls[long_call_index].instrument.symbol
+    long_put_index = ticker_option_chain.atm_index(put_greeks.strike - params.spread_width, "PUT")
+    long_put_symbol = ticker_option_chain.puts[long_put_index].instrument.symbol
 
     #assert call_greeks.symbol != short_call_symbol, f"ERROR: CALL {repr(call_greeks.symbol)} != {repr(short_call_symbol)}"
 
     #assert put_greeks.symbol != short_put_symbol, f"ERROR: PUT {repr(put_greeks.symbol)} != {repr(short_put_symbol)}"
 
-    call_credit_spread = CreditSpread(short_symbol=call_greeks.symbol, long_symbol=long_call_symbol, quantity=1, limit_price= MINIMUM_CREDIT)
-    put_credit_spread = CreditSpread(short_symbol = put_greeks.symbol, long_symbol = long_put_symbol, quantity = 1, limit_price = MINIMUM_CREDIT)
+    call_credit_spread = CreditSpread(short_symbol=call_greeks.symbol, long_symbol=long_call_symbol, quantity=1, limit_price= params.minimum_credit)
+    put_credit_spread = CreditSpread(short_symbol = put_greeks.symbol, long_symbol = long_put_symbol, quantity = 1, limit_price = params.minimum_credit)
+    if params.limit_pricing == "mid":
+        price_spreads_at_mid([call_credit_spread, put_credit_spread], params.minimum_credit, account_id, api_key)
 
     iron_condor = IronCondor(call_credit_spread=call_credit_spread, put_credit_spread=put_credit_spread)
+    iron_condor.timings.append(search_timing)
     return iron_condor
 
 
+# -----------------------------
+# Async API layer
+# -----------------------------
+# Each call runs the blocking wrapper on a worker thread, so concurrent
+# requests still share the pooled keep-alive client.
+
+async def get_quote_async(instrument: Instrument, account_id: str, api_key: str) -> Quote:
+    return await asyncio.to_thread(get_quote, instrument, account_id, api_key)
+
+async def get_option_chain_async(instrument: Instrument, account_id: str, api_key: str, expiration_date: str, lazy: bool = False) -> OptionChain:
+    return await asyncio.to_thread(get_option_chain, instrument, account_id, api_key, expiration_date, lazy)
+
+async def get_greeks_async(symbol: str, account_id: str, api_key: str) -> Greeks:
+    return await asyncio.to_thread(get_greeks, symbol, account_id, api_key)
+
+async def get_greeks_batch_async(symbols: List[str], account_id: str, api_key: str) -> Dict[str, Greeks]:
+    return await asyncio.to_thread(get_greeks_batch, symbols, account_id, api_key)
+
+async def get_account_portfolio_async(account_id: str, api_key: str) -> Portfolio:
+    return await asyncio.to_thread(get_account_portfolio, account_id, api_key)
+
+async def get_account_portfolio_payload_async(account_id: str, api_key: str) -> dict:
+    return await asyncio.to_thread(get_account_portfolio_payload, account_id, api_key)
+
+async def run_trade_pre_flight_async(account_id: str, api_key: str, short_symbol: str, long_symbol: str, quantity: int, limit_price: float, option_type: str):
+    return await asyncio.to_thread(run_trade_pre_flight, account_id, api_key, short_symbol, long_symbol, quantity, limit_price, option_type)
+
+async def execute_multi_leg_trade_async(account_id: str, api_key: str, short_symbol: str, long_symbol: str, quantity: int, limit_price: float) -> str:
+    return await asyncio.to_thread(execute_multi_leg_trade, account_id, api_key, short_symbol, long_symbol, quantity, limit_price)
+
+
+# -----------------------------
+# Streaming market data
+# -----------------------------
+
+# a streamed quote older than this (seconds) is ignored and the cycle fetches its own
+STREAM_MAX_AGE = 5
+# strikes either side of ATM that get streamed into the chain
+STREAM_STRIKE_WINDOW = 15
+
+class QuoteTransport(ABC):
+    """Where a QuoteStream gets its quotes from. run() blocks until stop is set, reading
+    stream.subscribed() for what to fetch and handing every quote it receives to stream.publish().
+    """
+    @abstractmethod
+    def run(self, stream: "QuoteStream", stop: threading.Event) -> None:
+        ...
+
+
+class PollingTransport(QuoteTransport):
+    """Fallback for when there is no push feed, every subscribed symbol is re-quoted each interval (in as few requests as QUOTES_BATCH_SIZE allows)."""
+    def __init__(self, account_id: str, api_key: str, interval: float = 1.0):
+        self.account_id = account_id
+        self.api_key = api_key
+        self.interval = interval
+
+    def run(self, stream: "QuoteStream", stop: threading.Event) -> None:
+        while not stop.is_set():
+            instruments = stream.subscribed()
+            if instruments:
+                try:
+                    for quote in get_quotes(instruments, self.account_id, self.api_key).values():
+                        stream.publish(quote)
+                except (r.RequestException, ApiError) as e:
+                    log_event("quote_poll_failed", f"Quote poll failed: {e!r}", logging.WARNING)
+            stop.wait(self.interval)
+
+
+class SSETransport(QuoteTransport):
+    """Server-sent events feed where every `data:` line is one quote object shaped like the quotes endpoint's.
+    Reconnects (with the current subscriptions) whenever the connection drops or they change.
+    """
+    def __init__(self, url: str, api_key: str, reconnect_delay: float = 1.0, read_timeout: float = 30):
+        self.url = url
+        self.api_key = api_key
+        self.reconnect_delay = reconnect_delay
+        self.read_timeout = read_timeout
+
+    def run(self, stream: "QuoteStream", stop: threading.Event) -> None:
+        session = get_client(self.api_key).session
+        while not stop.is_set():
+            instruments = stream.subscribed()
+            version = stream.subscription_version
+            try:
+                params = {"symbols": ",".join(i.symbol for i in instruments)}
+                with session.get(self.url, params=params, stream=True, timeout=(3.05, self.read_timeout),
+                                 headers={"Accept": "text/event-stream"}) as response:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if stop.is_set() or stream.subscription_version != version:
+                            break
+                        if line and line.startswith("data:"):
+                            stream.publish(Quote.from_dict(json.loads(line[5:])))
+            except (r.RequestException, ValueError) as e:
+                log_event("quote_stream_dropped", f"Quote stream dropped: {e!r}", logging.WARNING)
+            stop.wait(self.reconnect_delay)
+
+
+class QuoteStream:
+    """Latest quote per subscribed symbol, fed by a transport on a background thread.
+
+    Option quotes are patched into any attached chain at their strike, underlying quotes are fed to the
+    greeks cache, and on_change listeners are called only when last, bid or ask actually moved.
+    """
+    def __init__(self, transport: QuoteTransport, clock=time.monotonic):
+        self.transport = transport
+        self.clock = clock
+        self.subscription_version = 0
+        self.updates = 0
+        self.changes = 0
+        self._instruments: Dict[str, Instrument] = {}
+        self._latest: Dict[str, Quote] = {}
+        self._received: Dict[str, float] = {}
+        self._chains: Dict[str, OptionChain] = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, instruments: List[Instrument]) -> None:
+        with self._lock:
+            before = len(self._instruments)
+            for instrument in instruments:
+                self._instruments[instrument.symbol] = instrument
+            if len(self._instruments) != before:
+                self.subscription_version += 1
+
+    def unsubscribe(self, symbols: List[str]) -> None:
+        with self._lock:
+            for symbol in symbols:
+                self._instruments.pop(symbol, None)
+                self._latest.pop(symbol, None)
+                self._received.pop(symbol, None)
+            self.subscription_version += 1
+
+    def subscribed(self) -> List[Instrument]:
+        with self._lock:
+            return list(self._instruments.values())
+
+    def attach_chain(self, chain: OptionChain, symbols: Optional[List[str]] = None) -> None:
+        """Patch chain in place from now on, subscribing to symbols (every strike if None).
+        Replaces whatever chain was attached for the same underlying.
+        """
+        if symbols is None:
+            symbols = [q.instrument.symbol for q in chain.calls] + [q.instrument.symbol for q in chain.puts]
+        with self._lock:
+            previous = self._chains.get(chain.baseSymbol)
+            self._chains[chain.baseSymbol] = chain
+        if previous is not None and previous is not chain:
+            # strikes that fell out of the new window stop costing anything
+            keep = set(symbols)
+            stale = [i.symbol for i in self.subscribed() if i.type == "OPTION" and i.symbol[:-15] == chain.baseSymbol and i.symbol not in keep]
+            if stale:
+                self.unsubscribe(stale)
+        self.subscribe([Instrument(symbol, "OPTION") for symbol in symbols])
+
+    def on_change(self, callback, symbols: Optional[List[str]] = None) -> None:
+        """callback(quote, previous_quote) on the transport thread, for symbols (all if None). Keep it short."""
+        self._listeners.append((set(symbols) if symbols is not None else None, callback))
+
+    def latest(self, symbol: str, max_age: Optional[float] = None) -> Optional[Quote]:
+        """Most recent quote, or None if there isn't one younger than max_age seconds."""
+        with self._lock:
+            quote = self._latest.get(symbol)
+            received = self._received.get(symbol)
+        if quote is None or (max_age is not None and self.clock() - received > max_age):
+            return None
+        return quote
+
+    def age(self, symbol: str) -> Optional[float]:
+        """Seconds since symbol's latest quote arrived."""
+        with self._lock:
+            received = self._received.get(symbol)
+        return None if received is None else self.clock() - received
+
+    def publish(self, quote: Quote) -> None:
+        symbol = quote.instrument.symbol
+        with self._lock:
+            if symbol not in self._instruments:
+                return
+            previous = self._latest.get(symbol)
+            self._latest[symbol] = quote
+            self._received[symbol] = self.clock()
+            self.updates += 1
+            chain = self._chains.get(symbol[:-15]) if quote.instrument.type == "OPTION" else None
+        if previous is not None and (previous.last, previous.bid, previous.ask) == (quote.last, quote.bid, quote.ask):
+            return
+        self.changes += 1
+        if chain is not None:
+            chain.patch_quote(quote)
+        elif quote.instrument.type != "OPTION":
+            greeks_cache.observe_underlying(symbol, quote.last)
+        for symbols, callback in self._listeners:
+            if symbols is None or symbol in symbols:
+                callback(quote, previous)
+
+    def start(self) -> "QuoteStream":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.transport.run, args=(self, self._stop), name="quotes", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def chain_window_symbols(option_chain: OptionChain, price: float, window: int) -> List[str]:
+    """Call and put symbols within window strikes of ATM, the part of the chain worth streaming."""
+    symbols = []
+    for option_type in ("CALL", "PUT"):
+        atm = option_chain.atm_index(price, option_type)
+        quotes = option_chain.quotes(option_type)
+        symbols += [quotes[i].instrument.symbol for i in range(max(atm - window, 0), min(atm + window + 1, len(quotes)))]
+    return symbols
+
+def make_quote_stream(account_id: str, api_key: str) -> Optional[QuoteStream]:
+    """Stream configured from the environment: MEIC_STREAM_URL for an SSE feed, MEIC_STREAM=poll for the
+    polling fallback (MEIC_POLL_INTERVAL seconds). None when neither is set and cycles fetch quotes themselves.
+    """
+    url = os.environ.get("MEIC_STREAM_URL")
+    if url:
+        return QuoteStream(SSETransport(url, api_key))
+    if os.environ.get("MEIC_STREAM") == "poll":
+        return QuoteStream(PollingTransport(account_id, api_key, float(os.environ.get("MEIC_POLL_INTERVAL", 1.0))))
+    return None
+
+
 pst = pytz.timezone("US/Pacific")
 
+TRADING_START = dt_time(6, 32) # 6:32 AM 
+TRADING_END = dt_time(12, 59) # 12:59 PM 
+
 def is_within_trading_hours(now: datetime) -> bool: 
-    start = dt_time(6, 32) # 6:32 AM 
-    end = dt_time(12, 59) # 11:00 AM 
-    return start <= now.time() <= end
+    return TRADING_START <= now.time() <= TRADING_END
 
 ticker = Instrument('SPY','EQUITY')
 EXPECTED_MOVE = 2
+SPREAD_WIDTH = 2
+# "remote": short strikes picked from API greeks, "local": picked from compute_local_greeks and confirmed with one API call
+GREEKS_MODE = "remote"
 MAX_OPEN_POSITIONS = 1
-today = "2025-12-30" #date.today().strftime("%Y-%m-%d")
-print(f"Starting 0 DTE trading for {today}")
-# default timing
-sleep = 15
-options_position_summary = OptionsPositionSummary()
-last_trade = LastTrade()
 # negative for credits, positive for debits
 MINIMUM_CREDIT = -0.20
+# "condor": preflight and submit all four legs as one order, falling back to two spreads if the API refuses.
+# "spreads": always two concurrent credit spread orders
+ORDER_MODE = "condor"
+# "minimum": every spread is offered at minimum_credit. "mid": the four legs are quoted in one batch right
+# after selection and each spread asks for its mid credit when that beats minimum_credit
+LIMIT_PRICING = "minimum"
+# "walk": step out from ATM + expected_move until the delta band, spread_width wide legs.
+# "scan": rank every short strike and scan width on both sides with scan_iron_condor, falling back to the walk
+# when nothing clears the filters
+STRIKE_SELECTION = "walk"
+# with a quote stream, an underlying move this big (dollars) since the last cycle runs the next one early
+WAKE_MOVE = 0.50
+# expiration traded by default (YYYY-MM-DD), today's 0DTE unless MEIC_EXPIRATION_DATE says otherwise
+today = os.environ.get("MEIC_EXPIRATION_DATE") or datetime.now(pst).strftime("%Y-%m-%d")
+
+@dataclass
+class StrategyParams:
+    expected_move: int = EXPECTED_MOVE
+    spread_width: float = SPREAD_WIDTH
+    greeks_mode: str = GREEKS_MODE
+    max_open_positions: int = MAX_OPEN_POSITIONS
+    minimum_credit: float = MINIMUM_CREDIT
+    wake_move: float = WAKE_MOVE
+    order_mode: str = ORDER_MODE
+    limit_pricing: str = LIMIT_PRICING
+    strike_selection: str = STRIKE_SELECTION
+    scan_widths: tuple = SCAN_WIDTHS
+
+    @staticmethod
+    def from_dict(d: dict) -> "StrategyParams":
+        return StrategyParams(**d)
+
+
+# -----------------------------
+# Chain prefetch
+# -----------------------------
 
-for i in range(1):
-    ticker_quote = get_quote(ticker, ACCOUNT_ID, API_KEY)
-    print(f"{ticker_quote.instrument.symbol}: last price {ticker_quote.last}")
-    # get portfolio info
-    portfolio_account = get_account_portfolio(ACCOUNT_ID, API_KEY)
-    portfolio_account.sort_positons()
-    options_position_summary = portfolio_account.evaluate_option_positions(options_position_summary)
-    if options_position_summary.positions_at_risk > 0:
+# chain downloads in flight at once, the option-chain rate limit paces them further
+PREFETCH_WORKERS = 4
+# warming starts this many seconds before TRADING_START
+PREFETCH_LEAD = 120
+# expirations prefetched per underlying, counting the traded one (1 = just 0DTE)
+PREFETCH_EXPIRATIONS = int(os.environ.get("MEIC_PREFETCH_EXPIRATIONS", 1))
+# share of each key's option-chain rate limit warming may use, the rest is left to the cycles
+PREFETCH_RATE_SHARE = 0.5
+
+def next_expirations(start: str, count: int) -> List[str]:
+    """start and the weekdays after it, count in all, as YYYY-MM-DD. Market holidays aren't skipped,
+    a chain request for one just fails and the prefetcher leaves it out.
+    """
+    day = datetime.strptime(start, "%Y-%m-%d").date()
+    dates = []
+    while len(dates) < count:
+        if day.weekday() < 5:
+            dates.append(day.strftime("%Y-%m-%d"))
+        day += timedelta(days=1)
+    return dates
+
+
+@dataclass
+class ChainTarget:
+    instrument: Instrument
+    expiration_date: str
+    account_id: str
+    api_key: str
+
+    @property
+    def key(self) -> tuple:
+        # same key ChainCache files the chain under
+        return (self.instrument.symbol, self.expiration_date)
+
+
+class ChainPrefetcher:
+    """Loads the chains for a set of (underlying, expiration) targets into a ChainCache through a bounded
+    pool, so cycles (and get_iron_condor) find them there instead of downloading them one after another.
+
+    warm() keeps them fresh from PREFETCH_LEAD seconds before TRADING_START until trading ends, dropping each
+    target once the strategy it was warmed for has entered (entered(target) turns true). After that the
+    cycles keep their own chain fresh.
+    """
+    def __init__(self, targets: List[ChainTarget], cache: Optional[ChainCache] = None, max_workers: int = PREFETCH_WORKERS,
+                 lazy: bool = True):
+        self.targets = list({target.key: target for target in targets}.values())
+        self.cache = cache or chain_cache
+        # room for every target on top of what the cycles cache themselves
+        self.cache.max_entries = max(self.cache.max_entries, 2 * len(self.targets))
+        self.lazy = lazy
+        self.rounds = 0
+        self.failures = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def prefetch(self, targets: Optional[List[ChainTarget]] = None) -> Dict[tuple, OptionChain]:
+        """Fetch every target concurrently (fresh cached chains are re-fetched too), keyed like the cache.
+        A target that fails is logged and left out.
+        """
+        targets = self.targets if targets is None else targets
+        start = time.perf_counter()
+        futures = {target.key: self._pool.submit(self.cache.refresh, target.instrument, target.account_id, target.api_key,
+                                                 target.expiration_date, self.lazy)
+                   for target in targets}
+        chains = {}
+        for key, future in futures.items():
+            try:
+                chains[key] = future.result()
+            except (r.RequestException, ApiError) as e:
+                self.failures += 1
+                log_event("prefetch_failed", f"Prefetch of {key[0]} {key[1]} failed: {e!r}", logging.WARNING,
+                          symbol=key[0], expiration_date=key[1])
+        self.rounds += 1
+        duration_ms = (time.perf_counter() - start) * 1000
+        log_event("prefetch", f"Prefetched {len(chains)}/{len(futures)} chains in {duration_ms:.0f} ms",
+                  fetched=len(chains), targets=len(futures), duration_ms=duration_ms)
+        return chains
+
+    def round_interval(self, targets: List[ChainTarget], interval: float) -> float:
+        """interval, stretched so a round of targets takes at most PREFETCH_RATE_SHARE of each API key's
+        option-chain rate limit and the cycles' own chain requests aren't throttled behind it.
+        """
+        per_key: Dict[str, int] = {}
+        for target in targets:
+            per_key[target.api_key] = per_key.get(target.api_key, 0) + 1
+        for api_key, count in per_key.items():
+            rate = get_client(api_key).rate_limits.get("option-chain", DEFAULT_RATE_LIMIT)[0]
+            interval = max(interval, count / (rate * PREFETCH_RATE_SHARE))
+        return interval
+
+    def warm(self, entered: Callable[[ChainTarget], bool], lead: float = PREFETCH_LEAD, interval: Optional[float] = None,
+             clock=lambda: datetime.now(pst)) -> "ChainPrefetcher":
+        """Start warming on a background thread, re-fetching every interval (default just under the cache TTL,
+        stretched by round_interval) the targets entered() says haven't been entered on yet.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            interval = interval if interval is not None else self.cache.ttl_seconds * 0.8
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(entered, lead, interval, clock), name="chain-prefetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self, entered: Callable[[], bool], lead: float, interval: float, clock) -> None:
+        while not self._stop.is_set():
+            now = clock()
+            start = now.replace(hour=TRADING_START.hour, minute=TRADING_START.minute, second=0, microsecond=0)
+            until_warm = (start - timedelta(seconds=lead) - now).total_seconds()
+            if until_warm > 0:
+                self._stop.wait(until_warm)
+                continue
+            targets = [target for target in self.targets if not entered(target)]
+            if not targets or now.time() > TRADING_END:
+                return
+            self.prefetch(targets)
+            self._stop.wait(self.round_interval(targets, interval))
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self) -> None:
+        self.stop()
+        self._pool.shutdown(wait=False)
+
+
+# -----------------------------
+# Cycle scheduler
+# -----------------------------
+
+# seconds between cycles
+AT_RISK_INTERVAL = 5
+NORMAL_INTERVAL = 15
+OFF_HOURS_INTERVAL = 60
+
+def cycle_interval(options_position_summary: OptionsPositionSummary, now: datetime, watched: bool = False) -> float:
+    if not is_within_trading_hours(now):
+        start = now.replace(hour=TRADING_START.hour, minute=TRADING_START.minute, second=0, microsecond=0)
+        if now < start:
+            # wake right when the window opens, not up to OFF_HOURS_INTERVAL after
+            return min(OFF_HOURS_INTERVAL, (start - now).total_seconds())
+        return OFF_HOURS_INTERVAL
+    # an AtRiskWatcher already polls the at-risk legs, so the full refresh stays on the normal cadence
+    if options_position_summary.positions_at_risk > 0 and not watched:
         # if we have positions as risk (85% or greater loss), check live data more frequently
-        sleep = 5
-    else:
-        sleep = 15
+        return AT_RISK_INTERVAL
+    return NORMAL_INTERVAL
+
+
+@dataclass
+class CycleRecord:
+    cycle: int
+    # seconds past the cycle's deadline when it actually started
+    lateness: float
+    duration: float
+    interval: float
+    # deadlines dropped because the previous cycle overran them
+    skipped: int
+    # started early by wake() instead of on its deadline
+    woken: bool = False
+
+
+class DeadlineScheduler:
+    """Runs cycles on an absolute deadline grid instead of sleeping a fixed time after each one,
+    so API latency doesn't stretch the polling period.
+
+    If a cycle overruns one or more deadlines they are not queued up:
+    "skip" waits for the next deadline still in the future, "coalesce" runs one cycle
+    right away in place of all the missed ones and stays on the same grid.
+
+    wake() (e.g. from a QuoteStream listener) ends the wait early, the woken cycle runs at once
+    and the grid restarts from it. A custom sleep can't be interrupted, so it disables waking.
+    """
+    def __init__(self, overrun: str = "skip", clock=time.monotonic, sleep=None, history: int = 1000):
+        if overrun not in ("skip", "coalesce"):
+            raise ValueError(f"Unknown overrun policy: {overrun}")
+        self.overrun = overrun
+        self.clock = clock
+        self.sleep = sleep
+        self.records = deque(maxlen=history)
+        self.skipped_total = 0
+        self.woken_total = 0
+        self._wake = threading.Event()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _wait(self, seconds: float) -> bool:
+        """Sleep up to seconds, True if wake() cut it short."""
+        if self.sleep is not None:
+            self.sleep(seconds)
+            return False
+        return self._wake.wait(seconds)
+
+    def run(self, cycle_fn, should_continue, max_cycles: Optional[int] = None) -> None:
+        """cycle_fn() does one cycle and returns the interval until the next one is due."""
+        deadline = self.clock()
+        cycle = 0
+        skipped = 0
+        woken = False
+        while should_continue() and (max_cycles is None or cycle < max_cycles):
+            # anything that moved before now is seen by this cycle
+            self._wake.clear()
+            started = self.clock()
+            interval = cycle_fn()
+            finished = self.clock()
+            self.records.append(CycleRecord(
+                cycle=cycle,
+                lateness=max(started - deadline, 0.0),
+                duration=finished - started,
+                interval=interval,
+                skipped=skipped,
+                woken=woken,
+            ))
+            cycle += 1
+
+            deadline += interval
+            skipped = 0
+            if finished > deadline:
+                missed = 1 + int((finished - deadline) // interval)
+                if self.overrun == "coalesce":
+                    # one cycle now stands in for all of them, late against the most recent one missed
+                    skipped = missed - 1
+                else:
+                    skipped = missed
+                deadline += skipped * interval
+                self.skipped_total += skipped
+
+            woken = False
+            wait = deadline - self.clock()
+            if wait > 0 and self._wait(wait):
+                woken = True
+                self.woken_total += 1
+                deadline = self.clock()
+
+    def lateness_summary(self) -> str:
+        if not self.records:
+            return "no cycles run"
+        lateness_ms = sorted(record.lateness * 1000 for record in self.records)
+        p95 = lateness_ms[min(int(len(lateness_ms) * 0.95), len(lateness_ms) - 1)]
+        return (f"{len(lateness_ms)} cycles, lateness mean {sum(lateness_ms) / len(lateness_ms):.1f} ms, "
+                f"p95 {p95:.1f} ms, max {lateness_ms[-1]:.1f} ms, {self.skipped_total} deadlines skipped, "
+                f"{self.woken_total} woken early")
+
 
-    now = datetime.now(pst)
-    should_trade = False
+# -----------------------------
+# Trading cycle
+# -----------------------------
 
+def should_enter_trade(last_trade: LastTrade, now: datetime, max_open_positions: int = MAX_OPEN_POSITIONS) -> bool:
     if last_trade.count == 0:
         # first trade of the day, good luck!
-        should_trade = True
-    else:
-        time_diff = now - last_trade.timestamp
-        # if it's been 15 min since last position, and we have less than max position count
-        if time_diff >= timedelta(minutes=15) and last_trade.count < MAX_OPEN_POSITIONS:
-            should_trade = True
-
-
-    if should_trade:
-        print("Entering Trade")
-        if is_within_trading_hours(now):
-            iron_condor = get_iron_condor(ticker, ACCOUNT_ID, API_KEY, today, ticker_quote)
-            #print(f"Short Call strike {iron_condor.short_call_greeks.symbol} at delta of {iron_condor.short_call_greeks.delta} Long: {iron_condor.long_call_symbol}")
-            run_trade_pre_flight(ACCOUNT_ID, API_KEY, iron_condor.call_credit_spread.short_symbol, iron_condor.call_credit_spread.long_symbol, iron_condor.call_credit_spread.quantity, iron_condor.call_credit_spread.limit_price, "CALL")
-            #print(f"Short PUT strike {iron_condor.short_put_greeks.symbol} at delta of {iron_condor.short_put_greeks.delta} Long: {iron_condor.long_put_symbol}")
-            run_trade_pre_flight(ACCOUNT_ID, API_KEY, iron_condor.put_credit_spread.short_symbol, iron_condor.put_credit_spread.long_symbol, iron_condor.put_credit_spread.quantity, iron_condor.put_credit_spread.limit_price, "PUT")
-            
-            # sell call credit spread
-            execute_multi_leg_trade(ACCOUNT_ID, API_KEY, iron_condor.call_credit_spread.short_symbol, iron_condor.call_credit_spread.long_symbol, iron_condor.call_credit_spread.quantity, iron_condor.call_credit_spread.limit_price)
-            # sell put credit spread
-            execute_multi_leg_trade(ACCOUNT_ID,API_KEY, iron_condor.put_credit_spread.short_symbol, iron_condor.put_credit_spread.long_symbol, iron_condor.put_credit_spread.quantity, iron_condor.put_credit_spread.limit_price)
-
-            # add to portfolio as spread to close later if needed
-            portfolio_account.spreads_sold.append(iron_condor.call_credit_spread)
-            portfolio_account.spreads_sold.append(iron_condor.put_credit_spread)
+        return True
+    time_diff = now - last_trade.timestamp
+    # if it's been 15 min since last position, and we have less than max position count
+    return time_diff >= timedelta(minutes=15) and last_trade.count < max_open_positions
+
+# account -> trading day its API rejected a four-leg order, it goes straight to two spreads for the rest of that day
+_condor_orders_rejected: Dict[str, date] = {}
+# how a leg-count limit reads in an order rejection ("supports at most 2 legs", "maximum of 2 legs")
+CONDOR_LEG_LIMIT = re.compile(r"\b(?:at most|up to|max(?:imum)?(?: of)?)\s+\d+\s+legs?\b", re.IGNORECASE)
+
+def _single_stage_timing(stage: str, fn):
+    result, start, end = _timed(fn)
+    elapsed_ms = (end - start) * 1000
+    # one request carries both wings, so they can't drift apart
+    return result, LegTiming(stage=stage, call_ms=elapsed_ms, put_ms=elapsed_ms, skew_ms=0.0)
+
+def _condor_unsupported(response: r.Response) -> bool:
+    """The API saying it won't take four legs in one order, as opposed to any other 4xx (rate limit, auth,
+    buying power) which says nothing about the order shape and mustn't downgrade the account.
+    """
+    return response.status_code in (400, 422) and CONDOR_LEG_LIMIT.search(response.text) is not None
+
+def _reject_condor_orders(account_id: str) -> None:
+    _condor_orders_rejected[account_id] = datetime.now(pst).date()
+
+def _condor_orders_allowed(account_id: str) -> bool:
+    # a downgrade only lasts the day, an account that gains four-leg orders picks them up the next morning
+    return _condor_orders_rejected.get(account_id) != datetime.now(pst).date()
+
+def _place_as_condor(iron_condor: IronCondor, account_id: str, api_key: str) -> bool:
+    """Preflight and submit all four legs as one order, two round trips instead of four.
+    False (nothing was submitted) when the API turns the four-leg order down.
+    """
+    call_spread = iron_condor.call_credit_spread
+    put_spread = iron_condor.put_credit_spread
+    if call_spread.quantity != put_spread.quantity:
+        return False
+
+    response, preflight_timing = _single_stage_timing("preflight", lambda: run_iron_condor_pre_flight(account_id, api_key, iron_condor))
+    if _condor_unsupported(response):
+        _reject_condor_orders(account_id)
+        log_event("condor_rejected", f"Four-leg order rejected ({response.status_code}), placing as two spreads", logging.WARNING,
+                  status=response.status_code)
+        return False
+    if 400 <= response.status_code < 500:
+        # nothing was sent, the cycle fails and the next one tries again
+        response_json(response, "preflight")
+    if response.status_code != 200:
+        log_event("condor_preflight_failed", f"Four-leg preflight failed ({response.status_code}), placing as two spreads", logging.WARNING,
+                  status=response.status_code)
+        return False
+
+    try:
+        response, submit_timing = _single_stage_timing("submit", lambda: execute_iron_condor_trade(account_id, api_key, iron_condor))
+    except r.ConnectTimeout:
+        # never connected, so nothing was sent
+        raise
+    except r.RequestException as e:
+        raise OrderOutcomeUnknown("order", f"four-leg submit failed after sending: {e!r}") from e
+    if _condor_unsupported(response):
+        # a rejected order never reached the book, so the two-spread path can't double up
+        _reject_condor_orders(account_id)
+        log_event("condor_rejected", f"Four-leg order rejected ({response.status_code}), placing as two spreads", logging.WARNING,
+                  status=response.status_code)
+        return False
+    if 400 <= response.status_code < 500:
+        # rejected for some other reason, so nothing opened, fail the cycle without downgrading
+        response_json(response, "order")
+    # anything else may or may not have opened the position, falling back could open it twice
+    if not response.ok:
+        raise OrderOutcomeUnknown("order", response.text, response.status_code)
+    iron_condor.timings.extend([preflight_timing, submit_timing])
+    return True
+
+def _place_as_spreads(iron_condor: IronCondor, account_id: str, api_key: str) -> None:
+    call_spread = iron_condor.call_credit_spread
+    put_spread = iron_condor.put_credit_spread
+    _, _, preflight_timing = run_legs_concurrently(
+        "preflight",
+        lambda: run_trade_pre_flight(account_id, api_key, call_spread.short_symbol, call_spread.long_symbol, call_spread.quantity, call_spread.limit_price, "CALL"),
+        lambda: run_trade_pre_flight(account_id, api_key, put_spread.short_symbol, put_spread.long_symbol, put_spread.quantity, put_spread.limit_price, "PUT"),
+    )
+
+    # sell call and put credit spreads together
+    try:
+        _, _, submit_timing = run_legs_concurrently(
+            "submit",
+            lambda: execute_multi_leg_trade(account_id, api_key, call_spread.short_symbol, call_spread.long_symbol, call_spread.quantity, call_spread.limit_price),
+            lambda: execute_multi_leg_trade(account_id, api_key, put_spread.short_symbol, put_spread.long_symbol, put_spread.quantity, put_spread.limit_price),
+        )
+    except (ApiError, r.RequestException) as e:
+        # only the first failure surfaces, the other wing may well have filled
+        raise OrderOutcomeUnknown("order", f"spread submit failed, the other wing may have filled: {e}") from e
+    iron_condor.timings.extend([preflight_timing, submit_timing])
+
+def place_iron_condor(iron_condor: IronCondor, portfolio_store: PortfolioStore, account_id: str, api_key: str,
+                      order_mode: str = ORDER_MODE) -> None:
+    call_spread = iron_condor.call_credit_spread
+    put_spread = iron_condor.put_credit_spread
+    placed = False
+    try:
+        if order_mode == "condor" and _condor_orders_allowed(account_id):
+            placed = _place_as_condor(iron_condor, account_id, api_key)
+        if not placed:
+            _place_as_spreads(iron_condor, account_id, api_key)
+    except OrderOutcomeUnknown as e:
+        # count it as sold, the next portfolio response pairs whatever actually filled
+        log_event("order_outcome_unknown", f"Order outcome unknown, treating as entered: {e}", logging.ERROR)
+        portfolio_store.record_sold(call_spread)
+        portfolio_store.record_sold(put_spread)
+        raise
+
+    for timing in iron_condor.timings:
+        log_event("leg_timing", f"{timing.stage}: call {timing.call_ms:.0f} ms, put {timing.put_ms:.0f} ms, legs {timing.skew_ms:.0f} ms apart",
+                  leg_stage=timing.stage, call_ms=timing.call_ms, put_ms=timing.put_ms, skew_ms=timing.skew_ms)
+    if iron_condor.quote_received is not None:
+        quote_to_order = time.perf_counter() - iron_condor.quote_received
+        quote_to_order_seconds.observe(quote_to_order, parse_option_symbol(call_spread.short_symbol)["underlying"])
+        log_event("quote_to_order", f"quote to order: {quote_to_order * 1000:.0f} ms", duration_ms=quote_to_order * 1000)
+
+    # add to portfolio as spread to close later if needed
+    portfolio_store.record_sold(call_spread)
+    portfolio_store.record_sold(put_spread)
+
+async def _stamped(awaitable):
+    """(result, perf_counter() when it arrived), for timing from that point rather than from when a gather finishes."""
+    result = await awaitable
+    return result, time.perf_counter()
+
+async def _streamed(quote: Quote, age: float):
+    # same shape as _stamped, dated back to when the stream received it
+    return quote, time.perf_counter() - age
+
+async def run_cycle_async(ticker: Instrument, account_id: str, api_key: str, expiration_date: str,
+                          options_position_summary: OptionsPositionSummary, last_trade: LastTrade,
+                          params: Optional[StrategyParams] = None, now: Optional[datetime] = None,
+                          stream: Optional[QuoteStream] = None, portfolio_store: Optional[PortfolioStore] = None,
+                          strategy: Optional[str] = None) -> float:
+    """One pass of the strategy. Quote, portfolio and (when we may enter) the chain are fetched
+    concurrently since none depends on another. Returns the interval (seconds) until the next cycle is due.
+    With a stream, a fresh streamed quote replaces the quote request and the chain is kept patched by it.
+    portfolio_store carries positions between cycles, without one every position is paired and scored from scratch.
+    Events logged during the cycle carry a fresh cycle id and strategy (ticker symbol when not given).
+    """
+    with cycle_context(strategy or ticker.symbol):
+        return await _run_cycle(ticker, account_id, api_key, expiration_date, options_position_summary, last_trade,
+                                params, now, stream, portfolio_store)
+
+async def _run_cycle(ticker: Instrument, account_id: str, api_key: str, expiration_date: str,
+                     options_position_summary: OptionsPositionSummary, last_trade: LastTrade,
+                     params: Optional[StrategyParams], now: Optional[datetime],
+                     stream: Optional[QuoteStream], portfolio_store: Optional[PortfolioStore]) -> float:
+    params = params or StrategyParams()
+    portfolio_store = portfolio_store if portfolio_store is not None else PortfolioStore()
+    cycle_start = time.perf_counter()
+    now = now or datetime.now(pst)
+    should_trade = should_enter_trade(last_trade, now, params.max_open_positions)
+    fetch_chain = should_trade and is_within_trading_hours(now)
+
+    with stage("market_data"):
+        streamed = stream.latest(ticker.symbol, max_age=STREAM_MAX_AGE) if stream is not None else None
+        if streamed is not None:
+            fetches = [_streamed(streamed, stream.age(ticker.symbol) or 0.0)]
+        else:
+            fetches = [_stamped(get_quote_async(ticker, account_id, api_key))]
+        fetches.append(get_account_portfolio_payload_async(account_id, api_key))
+        if fetch_chain:
+            fetches.append(asyncio.to_thread(chain_cache.get_chain, ticker, account_id, api_key, expiration_date, True))
+        results = await asyncio.gather(*fetches)
+        (ticker_quote, quote_received), portfolio_payload = results[0], results[1]
+        fetch_ms = (time.perf_counter() - cycle_start) * 1000
+        log_event("quote", f"{ticker_quote.instrument.symbol}: last price {ticker_quote.last}{' (streamed)' if streamed is not None else ''}",
+                  symbol=ticker_quote.instrument.symbol, last=ticker_quote.last, streamed=streamed is not None)
+
+    with stage("portfolio"):
+        if stream is not None and fetch_chain:
+            stream.attach_chain(results[2], chain_window_symbols(results[2], ticker_quote.last, STREAM_STRIKE_WINDOW))
+        diff = portfolio_store.apply(portfolio_payload)
+        if diff:
+            log_event("portfolio_diff", f"Portfolio: {len(diff.added)} added, {len(diff.removed)} removed, {len(diff.changed)} changed, "
+                      f"{len(portfolio_store.spreads)} spreads",
+                      added=len(diff.added), removed=len(diff.removed), changed=len(diff.changed), spreads=len(portfolio_store.spreads))
+        portfolio_store.evaluate_option_positions(options_position_summary)
+
+    # only an order placed inside the window counts as an entry, off-hours cycles leave last_trade alone
+    if fetch_chain:
+        log_event("entry", "Entering Trade")
+        with stage("select"):
+            iron_condor = await asyncio.to_thread(get_iron_condor, ticker, account_id, api_key, expiration_date, ticker_quote, results[2], params)
+            iron_condor.quote_received = quote_received
+        with stage("order"):
+            try:
+                await asyncio.to_thread(place_iron_condor, iron_condor, portfolio_store, account_id, api_key, params.order_mode)
+            except OrderOutcomeUnknown:
+                # may have opened the position, so it counts against max_open_positions like a fill
+                last_trade.count += 1
+                last_trade.timestamp = now
+                raise
 
         last_trade.count += 1
         last_trade.timestamp = now
 
+    duration_ms = (time.perf_counter() - cycle_start) * 1000
+    log_event("cycle_done", f"Cycle took {duration_ms:.0f} ms (market data {fetch_ms:.0f} ms)", duration_ms=duration_ms, fetch_ms=fetch_ms)
+    return cycle_interval(options_position_summary, datetime.now(pst))
+
+
+# -----------------------------
+# At-risk watcher
+# -----------------------------
+
+# seconds between watcher polls, and how long one may take from quote request to close decision
+WATCH_INTERVAL = 1.0
+WATCH_BUDGET = 0.5
+
+watch_seconds = metrics.histogram("meic_watch_seconds", "At-risk watcher poll, quote request to close decision", ("underlying",))
+
+def closing_loss_pct(legs: List[HeldOption], quotes: Dict[str, Quote]) -> Optional[float]:
+    """Loss % against cost basis if the legs were closed now: shorts bought back at the ask, longs sold
+    at the bid. None when a leg has no two-sided quote.
+    """
+    cost = 0
+    value = 0
+    for leg in legs:
+        quote = quotes.get(leg.symbol)
+        if quote is None or not quote.bid or not quote.ask:
+            return None
+        price = quote.ask if leg.position.quantity < 0 else quote.bid
+        # per-share price in cents, 100 shares a contract
+        value += to_cents(price) * 100 * leg.position.quantity
+        cost += leg.position.total_cost or 0
+    if not cost:
+        return None
+    return (value - cost) / abs(cost) * 100
+
+
+class AtRiskWatcher:
+    """While positions are at risk, polls just their legs and the underlying in one quotes request
+    every interval, re-scores them locally from their cost basis and closes anything past
+    CLOSE_LOSS_PCT, instead of waiting for the next full portfolio refresh.
+    """
+    def __init__(self, portfolio_store: PortfolioStore, underlying: Instrument, account_id: str, api_key: str,
+                 options_position_summary: OptionsPositionSummary, interval: float = WATCH_INTERVAL, budget: float = WATCH_BUDGET):
+        self.store = portfolio_store
+        self.underlying = underlying
+        self.account_id = account_id
+        self.api_key = api_key
+        self.options_position_summary = options_position_summary
+        self.interval = interval
+        self.budget = budget
+        self.polls = 0
+        self.over_budget = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def poll(self) -> List[object]:
+        """One pass, returns the keys it closed."""
+        start = time.perf_counter()
+        legs_by_key = self.store.at_risk_legs()
+        if not legs_by_key:
+            return []
+        symbols = {leg.symbol for legs in legs_by_key.values() for leg in legs}
+        instruments = [self.underlying] + [Instrument(symbol, "OPTION") for symbol in sorted(symbols)]
+        quotes = get_quotes(instruments, self.account_id, self.api_key)
+
+        for key, legs in legs_by_key.items():
+            loss_pct = closing_loss_pct(legs, quotes)
+            if loss_pct is not None:
+                self.store.rescore(key, loss_pct)
+        closed = self.store.evaluate_option_positions(self.options_position_summary)
+
+        elapsed = time.perf_counter() - start
+        self.polls += 1
+        watch_seconds.observe(elapsed, self.underlying.symbol)
+        if elapsed > self.budget:
+            self.over_budget += 1
+            log_event("watch_over_budget", f"At-risk poll took {elapsed * 1000:.0f} ms, budget is {self.budget * 1000:.0f} ms", logging.WARNING,
+                      duration_ms=elapsed * 1000, budget_ms=self.budget * 1000)
+        return closed
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # each poll is logged as a cycle of its own
+            with cycle_context(f"{self.underlying.symbol} watch"):
+                try:
+                    self.poll()
+                except (ApiError, r.RequestException) as e:
+                    log_event("watch_failed", f"At-risk poll failed: {e}", logging.WARNING)
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"watch-{self.underlying.symbol}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 5)
+            self._thread = None
 
 
-    for i in range(sleep,0,-1):
-        if i % 3 == 0:
-            print(f"New data in {i} seconds")
-        time.sleep(1)
+# -----------------------------
+# Multi-instance runner
+# -----------------------------
+
+@dataclass
+class StrategyConfig:
+    account_id: str
+    underlying: Instrument
+    params: StrategyParams = field(default_factory=StrategyParams)
+    expiration_date: str = today
+    api_key: str = API_KEY
+    # expiration_date and the next ones after it whose chains are prefetched
+    prefetch_expirations: int = PREFETCH_EXPIRATIONS
+
+    @property
+    def name(self) -> str:
+        return f"{self.account_id}:{self.underlying.symbol}"
+
+    def chain_targets(self) -> List[ChainTarget]:
+        return [ChainTarget(self.underlying, expiration_date, self.account_id, self.api_key)
+                for expiration_date in next_expirations(self.expiration_date, self.prefetch_expirations)]
 
+    @staticmethod
+    def from_dict(d: dict) -> "StrategyConfig":
+        return StrategyConfig(
+            account_id=d.get("accountId", ACCOUNT_ID),
+            underlying=Instrument(symbol=d["symbol"], type=d.get("type", "EQUITY")),
+            params=StrategyParams.from_dict(d.get("params", {})),
+            expiration_date=d.get("expirationDate", today),
+            api_key=d.get("apiKey", API_KEY),
+            prefetch_expirations=d.get("prefetchExpirations", PREFETCH_EXPIRATIONS),
+        )
 
-print("Done for day")
 
+class StrategyInstance:
+    """One MEIC strategy on one (account, underlying). Trade state is its own, while the HTTP
+    client, chain cache and greeks cache are the shared module-level ones.
+    """
+    def __init__(self, config: StrategyConfig, stream: Optional[QuoteStream] = None):
+        self.config = config
+        self.options_position_summary = OptionsPositionSummary()
+        self.last_trade = LastTrade()
+        self.scheduler = DeadlineScheduler()
+        self.portfolio = PortfolioStore()
+        self.watcher = AtRiskWatcher(self.portfolio, config.underlying, config.account_id, config.api_key, self.options_position_summary)
+        self.stream = stream
+        # underlying price as of the last cycle, what a streamed move is measured against
+        self.cycle_price: Optional[float] = None
+        if stream is not None:
+            stream.subscribe([config.underlying])
+            stream.on_change(self._on_underlying, [config.underlying.symbol])
+
+    def _on_underlying(self, quote: Quote, previous: Optional[Quote]) -> None:
+        if self.cycle_price is not None and abs(quote.last - self.cycle_price) >= self.config.params.wake_move:
+            self.scheduler.wake()
+
+    def run_cycle(self) -> float:
+        config = self.config
+        try:
+            interval = asyncio.run(run_cycle_async(config.underlying, config.account_id, config.api_key, config.expiration_date,
+                                                   self.options_position_summary, self.last_trade, config.params, stream=self.stream,
+                                                   portfolio_store=self.portfolio, strategy=config.name))
+        except (ApiError, r.RequestException) as e:
+            # retries are already spent, sit this cycle out and try again on the next one
+            log_event("cycle_failed", f"{config.name}: cycle failed: {e}", logging.ERROR, strategy_name=config.name)
+            interval = cycle_interval(self.options_position_summary, datetime.now(pst))
+        if self.options_position_summary.positions_at_risk > 0:
+            self.watcher.start()
+            interval = cycle_interval(self.options_position_summary, datetime.now(pst), watched=True)
+        elif self.watcher.running:
+            self.watcher.stop()
+        if self.stream is not None:
+            latest = self.stream.latest(config.underlying.symbol)
+            self.cycle_price = latest.last if latest is not None else None
+        if METRICS_FILE:
+            metrics.write_textfile(METRICS_FILE)
+        return interval
+
+    def run(self, should_continue, max_cycles: Optional[int] = None) -> None:
+        try:
+            self.scheduler.run(self.run_cycle, should_continue, max_cycles)
+        finally:
+            self.watcher.stop()
+
+
+class StrategyRunner:
+    """Runs every configured instance on its own worker thread, each on its own deadline schedule."""
+    # concurrent requests one instance can have in flight (quote, portfolio, chain, both legs)
+    CONNECTIONS_PER_INSTANCE = 4
+
+    def __init__(self, configs: List[StrategyConfig], stream: Optional[QuoteStream] = None):
+        self.instances = [StrategyInstance(config, stream) for config in configs]
+        # size each key's shared pool up front so adding instances doesn't make them queue for sockets
+        per_key: Dict[str, int] = {}
+        for config in configs:
+            per_key[config.api_key] = per_key.get(config.api_key, 0) + 1
+        for api_key, count in per_key.items():
+            get_client(api_key, pool_maxsize=max(10, count * self.CONNECTIONS_PER_INSTANCE))
+
+    def run(self, should_continue, max_cycles: Optional[int] = None) -> None:
+        with ThreadPoolExecutor(max_workers=len(self.instances), thread_name_prefix="strategy") as pool:
+            futures = {pool.submit(instance.run, should_continue, max_cycles): instance for instance in self.instances}
+            for future, instance in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    log_event("strategy_stopped", f"{instance.config.name}: stopped with {e!r}", logging.ERROR, strategy_name=instance.config.name)
+
+    def summary(self) -> List[str]:
+        return [f"{instance.config.name}: {instance.scheduler.lateness_summary()}" for instance in self.instances]
+
+    def entered(self, target: ChainTarget) -> bool:
+        """True once every instance target's chain is prefetched for has made an entry, it needn't be warmed after that."""
+        return all(instance.last_trade.count > 0 for instance in self.instances
+                   if any(own.key == target.key for own in instance.config.chain_targets()))
+
+
+def load_strategy_configs(path: str) -> List[StrategyConfig]:
+    with open(path) as f:
+        return [StrategyConfig.from_dict(d) for d in json.load(f)]
+
+
+if __name__ == "__main__":
+    # MEIC_LOG_LEVEL / MEIC_LOG_FILE, the file gets every event as a JSON line
+    configure_logging()
+    log_event("start", f"Starting 0 DTE trading for {today}", expiration_date=today)
+    # MEIC_STRATEGIES points at a JSON list of {"accountId", "symbol", "params": {...}} to run several at once,
+    # optionally with "expirationDate" and "prefetchExpirations"
+    strategies_path = os.environ.get("MEIC_STRATEGIES")
+    if strategies_path:
+        configs = load_strategy_configs(strategies_path)
+    else:
+        configs = [StrategyConfig(account_id=ACCOUNT_ID, underlying=ticker)]
+
+    if METRICS_PORT:
+        metrics.serve(int(METRICS_PORT))
+        log_event("metrics", f"Serving metrics on http://127.0.0.1:{METRICS_PORT}/metrics", port=int(METRICS_PORT))
+
+    # cycles run when the underlying moves, on top of the timer, if a feed is configured
+    stream = make_quote_stream(configs[0].account_id, configs[0].api_key)
+    runner = StrategyRunner(configs, stream)
+    if stream is not None:
+        stream.start()
+    # chains are downloaded ahead of the entry window, so the first trade doesn't wait on them
+    prefetcher = ChainPrefetcher([target for config in configs for target in config.chain_targets()])
+    prefetcher.warm(runner.entered)
+    runner.run(lambda: datetime.now(pst).time() <= TRADING_END)
+    prefetcher.close()
+    if stream is not None:
+        stream.stop()
+        log_event("stream_summary", f"Quote stream: {stream.updates} updates, {stream.changes} price changes",
+                  updates=stream.updates, changes=stream.changes)
+
+    for line in runner.summary():
+        log_event("scheduler_summary", f"Scheduler {line}")
+    for api_key in {config.api_key for config in configs}:
+        stats = get_client(api_key).connection_stats()
+        log_event("connection_summary", f"Connections: {stats.requests_sent} requests over {stats.connections_opened} connections ({stats.reuse_ratio:.0%} reused)",
+                  requests=stats.requests_sent, connections=stats.connections_opened)
+    log_event("done", "Done for day")
+    stop_logging()
@@ -0,0 +1,92 @@
+import argparse
+import json
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from meic import (ACCOUNT_ID, API_KEY, ColumnarOptionChain, Greeks, OptionChain,
+                  in_short_delta_band, compute_local_greeks, get_greeks_batch, underlying_stub)
+
+
+CHAIN_FIXTURE = "Get_Option_Chain.json"
+
+
+def snapshot_time(payload: dict) -> datetime:
+    # latest quote timestamp on the chain, that's when it was captured
+    stamps = [q["bidTimestamp"] for q in payload["calls"] + payload["puts"] if q["bidTimestamp"]]
+    return datetime.fromisoformat(max(stamps).replace("Z", "+00:00"))
+
+def load_api_greeks(path: str) -> Dict[str, Greeks]:
+    # same shape as the greeks endpoint response
+    with open(path) as f:
+        data = json.load(f)
+    greeks = [Greeks.from_entry(entry) for entry in data["greeks"]]
+    return {g.symbol: g for g in greeks}
+
+def delta_report(payload: dict, window: int) -> List[dict]:
+    chain = OptionChain.from_dict(payload, lazy=True)
+    # the recorded chain doesn't carry the underlying quote
+    spot = ColumnarOptionChain.from_chain(chain).parity_spot()
+    underlying = underlying_stub(chain.baseSymbol, spot)
+    local = compute_local_greeks(chain, underlying, now=snapshot_time(payload))
+    print(f"{chain.baseSymbol} spot {spot:.2f} (put-call parity), {local.years_to_expiry * 365 * 24:.2f} hours to expiry")
+
+    rows = []
+    for option_type in ("CALL", "PUT"):
+        side = local.side(option_type)
+        atm = chain.atm_index(spot, option_type)
+        for i in range(max(atm - window, 0), min(atm + window + 1, len(side.symbols))):
+            rows.append({
+                "symbol": side.symbols[i],
+                "type": option_type,
+                "strike": float(side.strike[i]),
+                "local_iv": float(side.implied_volatility[i]),
+                "local_delta": float(side.delta[i]),
+                "api_delta": None,
+            })
+    return rows
+
+def attach_api_deltas(rows: List[dict], api_greeks: Dict[str, Greeks]) -> None:
+    for row in rows:
+        remote = api_greeks.get(row["symbol"])
+        row["api_delta"] = remote.delta if remote else None
+
+def print_report(rows: List[dict]) -> None:
+    print(f"{'type':<5}{'strike':>9}{'local iv':>10}{'local d':>10}{'api d':>10}{'diff':>9}")
+    diffs = []
+    band_agree = 0
+    for row in rows:
+        api_delta = row["api_delta"]
+        if api_delta is None:
+            print(f"{row['type']:<5}{row['strike']:>9.2f}{row['local_iv']:>10.3f}{row['local_delta']:>10.3f}{'-':>10}{'-':>9}")
+            continue
+        diff = row["local_delta"] - api_delta
+        diffs.append(abs(diff))
+        band_agree += in_short_delta_band(row["local_delta"]) == in_short_delta_band(api_delta)
+        print(f"{row['type']:<5}{row['strike']:>9.2f}{row['local_iv']:>10.3f}{row['local_delta']:>10.3f}{api_delta:>10.3f}{diff:>9.3f}")
+
+    if not diffs:
+        print("No API deltas to compare against, pass --api-greeks or --live")
+        return
+    print(f"compared {len(diffs)} strikes: mean |diff| {np.mean(diffs):.4f}, max |diff| {np.max(diffs):.4f}, "
+          f"short-strike band agreement {band_agree}/{len(diffs)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare locally priced deltas with API deltas on a recorded chain")
+    parser.add_argument("--chain", default=CHAIN_FIXTURE)
+    parser.add_argument("--api-greeks", help="recorded greeks endpoint response (JSON)")
+    parser.add_argument("--live", action="store_true", help="fetch API greeks for the window with the .env credentials")
+    parser.add_argument("--window", type=int, default=10, help="strikes either side of ATM")
+    args = parser.parse_args()
+
+    with open(args.chain) as f:
+        payload = json.load(f)
+
+    rows = delta_report(payload, args.window)
+    if args.api_greeks:
+        attach_api_deltas(rows, load_api_greeks(args.api_greeks))
+    elif args.live:
+        attach_api_deltas(rows, get_greeks_batch([row["symbol"] for row in rows], ACCOUNT_ID, API_KEY))
+    print_report(rows)